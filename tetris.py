@@ -1,245 +1,382 @@
 import pygame
-import random
-import json
+import numpy as np
+import argparse
 import os
 
-# Initialize Pygame
-pygame.init()
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT,
+    BLACK, WHITE, GRAY, DARK_GRAY, YELLOW, RED,
+    SHAPE_COLORS, ROTATION_TABLE,
+    ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP, ACTION_ROTATE, ACTION_HARD_DROP,
+    TetrisEngine, FixedTimestep,
+)
+from tetris_replay import ReplayRecorder
+from tetris_scores import HighScoreStore, new_game_id
+from tetris_profiler import FrameProfiler, PHASES, COUNTERS
 
 # Game Constants
 SCREEN_WIDTH = 550  # Increased to fit next piece preview
 SCREEN_HEIGHT = 700
 BLOCK_SIZE = 30
-GRID_WIDTH = 10
-GRID_HEIGHT = 20
 GAME_AREA_X = 50
 GAME_AREA_Y = 50
 
-# High score file path
-HIGH_SCORE_FILE = 'tetris_highscore.json'
+# Screen areas redrawn when the text in them changes
+HEADER_RECT = pygame.Rect(0, 0, GAME_AREA_X + GRID_WIDTH * BLOCK_SIZE, 70)
+SIDEBAR_RECT = pygame.Rect(GAME_AREA_X + GRID_WIDTH * BLOCK_SIZE + 2, 0,
+                           SCREEN_WIDTH - (GAME_AREA_X + GRID_WIDTH * BLOCK_SIZE + 2), SCREEN_HEIGHT)
+PLAYFIELD_RECT = pygame.Rect(GAME_AREA_X, GAME_AREA_Y, GRID_WIDTH * BLOCK_SIZE, GRID_HEIGHT * BLOCK_SIZE)
 
-# Colors (RGB format)
-BLACK = (0, 0, 0)
-WHITE = (255, 255, 255)
-GRAY = (128, 128, 128)
-DARK_GRAY = (50, 50, 50)
-CYAN = (0, 255, 255)
-YELLOW = (255, 255, 0)
-PURPLE = (128, 0, 128)
-GREEN = (0, 255, 0)
-RED = (255, 0, 0)
-BLUE = (0, 0, 255)
-ORANGE = (255, 165, 0)
+# Game logic runs in fixed ticks; drawing happens at up to MAX_FPS (0 means no limit)
+TICK_RATE = 60
+MAX_FPS = 60
 
-# Tetromino shapes (the classic 7 pieces)
-# Each shape is a list of coordinates relative to a center point
-SHAPES = {
-    'I': [[0, 0], [0, 1], [0, 2], [0, 3]],      # Line piece
-    'O': [[0, 0], [0, 1], [1, 0], [1, 1]],      # Square piece
-    'T': [[0, 1], [1, 0], [1, 1], [1, 2]],      # T-piece
-    'S': [[0, 1], [0, 2], [1, 0], [1, 1]],      # S-piece
-    'Z': [[0, 0], [0, 1], [1, 1], [1, 2]],      # Z-piece
-    'J': [[0, 0], [1, 0], [1, 1], [1, 2]],      # J-piece
-    'L': [[0, 2], [1, 0], [1, 1], [1, 2]]       # L-piece
-}
+# Profiler overlay (F3): screen area and how often its numbers are refreshed (ms)
+PROFILER_RECT = pygame.Rect(10, 10, 330, 16 * (len(PHASES) + len(COUNTERS) + 1) + 10)
+PROFILER_REFRESH = 250
 
-# Colors for each shape
-SHAPE_COLORS = {
-    'I': CYAN,
-    'O': YELLOW,
-    'T': PURPLE,
-    'S': GREEN,
-    'Z': RED,
-    'J': BLUE,
-    'L': ORANGE
-}
+# Most particles alive at once (extra ones are simply not created)
+MAX_PARTICLES = 300
 
-# SRS (Super Rotation System) Wall Kick Data
-# Format: rotation_state -> list of (x_offset, y_offset) to try
-# Simplified version - less aggressive kicks for more natural feel
+# Pieces shown in the sidebar: the next one in the big box, the rest at PREVIEW_BLOCK_SIZE
+PREVIEW_COUNT = 5
+PREVIEW_BLOCK_SIZE = 15
 
-# Wall kicks for J, L, T, S, Z pieces
-WALL_KICK_DATA = {
-    (0, 1): [(0, 0), (-1, 0), (1, 0), (0, -1)],  # 0->R
-    (1, 0): [(0, 0), (1, 0), (-1, 0), (0, 1)],   # R->0
-    (1, 2): [(0, 0), (1, 0), (-1, 0), (0, -1)],  # R->2
-    (2, 1): [(0, 0), (-1, 0), (1, 0), (0, 1)],   # 2->R
-    (2, 3): [(0, 0), (1, 0), (-1, 0), (0, -1)],  # 2->L
-    (3, 2): [(0, 0), (-1, 0), (1, 0), (0, 1)],   # L->2
-    (3, 0): [(0, 0), (-1, 0), (1, 0), (0, 1)],   # L->0
-    (0, 3): [(0, 0), (1, 0), (-1, 0), (0, -1)],  # 0->L
-}
+# Sidebar layout below the next piece box (which ends at y 220)
+INSTRUCTIONS_Y = 300
+QUEUE_Y = 440
 
-# Wall kicks for I piece (still needs more kicks due to its shape)
-WALL_KICK_DATA_I = {
-    (0, 1): [(0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0)],  # 0->R
-    (1, 0): [(0, 0), (1, 0), (-1, 0), (2, 0), (-2, 0)],  # R->0
-    (1, 2): [(0, 0), (1, 0), (-1, 0), (2, 0), (-2, 0)],  # R->2
-    (2, 1): [(0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0)],  # 2->R
-    (2, 3): [(0, 0), (1, 0), (-1, 0), (2, 0), (-2, 0)],  # 2->L
-    (3, 2): [(0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0)],  # L->2
-    (3, 0): [(0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0)],  # L->0
-    (0, 3): [(0, 0), (1, 0), (-1, 0), (2, 0), (-2, 0)],  # 0->L
-}
+# High score file path
+HIGH_SCORE_FILE = 'tetris_highscore.json'  # Old single-score file, imported once
+HIGH_SCORE_DB = 'tetris_scores.db'
 
 
-class Tetromino:
-    """Represents a single Tetris piece"""
-    
-    def __init__(self, shape_name):
-        self.shape_name = shape_name
-        self.shape = [block[:] for block in SHAPES[shape_name]]  # Deep copy
-        self.color = SHAPE_COLORS[shape_name]
-        # Start at the top center of the grid
-        self.x = GRID_WIDTH // 2 - 1
-        self.y = 0
-        # Track rotation state for SRS wall kicks (0=spawn, 1=right, 2=180, 3=left)
-        self.rotation_state = 0
-        
-    def get_blocks(self):
-        """Returns the absolute grid positions of all blocks in this piece"""
-        return [[self.x + block[0], self.y + block[1]] for block in self.shape]
-    
-    def rotate(self):
-        """Rotates the piece 90 degrees clockwise"""
-        # Rotation formula: (x, y) becomes (y, -x)
-        # Special case: don't rotate the square piece
-        if self.shape_name == 'O':
-            return
-        
-        self.shape = [[block[1], -block[0]] for block in self.shape]
-        # Update rotation state (0->1->2->3->0)
-        self.rotation_state = (self.rotation_state + 1) % 4
-    
-    def copy(self):
-        """Creates a copy of this tetromino"""
-        new_piece = Tetromino(self.shape_name)
-        new_piece.shape = [block[:] for block in self.shape]
-        new_piece.x = self.x
-        new_piece.y = self.y
-        new_piece.rotation_state = self.rotation_state
-        return new_piece
+def draw_border(surface, color, rect, width):
+    """Draws a rectangle outline inside rect, like pygame.draw.rect(..., width)
 
+    Built from filled strips so it still looks right when the surface has a
+    clip rect (pygame.draw.rect outlines the clipped rect instead).
+    """
+    x, y, w, h = rect
+    surface.fill(color, (x, y, w, width))
+    surface.fill(color, (x, y + h - width, w, width))
+    surface.fill(color, (x, y, width, h))
+    surface.fill(color, (x + w - width, y, width, h))
 
-class PieceBag:
-    """Implements the 7-bag random system for fair piece distribution"""
+
+class BlockSprites:
+    """Pre-rendered block surfaces, one per (color, alpha, size), built on first use"""
     
     def __init__(self):
-        self.bag = []
-        self.refill_bag()
-    
-    def refill_bag(self):
-        """Fills the bag with all 7 pieces in random order"""
-        pieces = list(SHAPES.keys())
-        random.shuffle(pieces)
-        self.bag.extend(pieces)
-    
-    def get_next_piece(self):
-        """Gets the next piece from the bag"""
-        if len(self.bag) == 0:
-            self.refill_bag()
-        return self.bag.pop(0)
+        self.sprites = {}
+    
+    def get(self, color, alpha=255, size=BLOCK_SIZE):
+        """Returns the block surface for a color and alpha (solid blocks have the border baked in)"""
+        key = (color, alpha, size)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface((size - 2, size - 2)).convert()
+            sprite.fill(color)
+            if alpha == 255:
+                # Border for depth (only for solid blocks; thinner on small ones)
+                draw_border(sprite, WHITE, (0, 0, size - 2, size - 2), 2 if size >= BLOCK_SIZE else 1)
+            else:
+                sprite.set_alpha(alpha)
+            self.sprites[key] = sprite
+        return sprite
 
 
-class Particle:
-    """Simple particle for visual effects"""
-    
-    def __init__(self, x, y, color, velocity_x, velocity_y, lifetime):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.velocity_x = velocity_x
-        self.velocity_y = velocity_y
-        self.lifetime = lifetime
-        self.max_lifetime = lifetime
-        self.size = random.randint(3, 8)
-    
-    def update(self, delta_time):
-        """Update particle position and lifetime"""
-        self.x += self.velocity_x * delta_time / 16.67  # Normalize to ~60fps
-        self.y += self.velocity_y * delta_time / 16.67
-        self.lifetime -= delta_time
-        return self.lifetime > 0  # Return False when particle should be removed
-    
-    def draw(self, screen, offset_x, offset_y):
-        """Draw the particle"""
-        alpha = int(255 * (self.lifetime / self.max_lifetime))
-        size = int(self.size * (self.lifetime / self.max_lifetime))
-        if size > 0:
-            particle_surface = pygame.Surface((size * 2, size * 2))
-            particle_surface.set_alpha(alpha)
-            particle_surface.fill(self.color)
-            screen.blit(particle_surface, (int(self.x + offset_x - size), int(self.y + offset_y - size)))
+def build_playfield_layers():
+    """Builds the static playfield surfaces: black background, gold flash and frame/grid lines"""
+    size = (GRID_WIDTH * BLOCK_SIZE, GRID_HEIGHT * BLOCK_SIZE)
+    background = pygame.Surface(size).convert()
+    background.fill(BLACK)
+    
+    flash = pygame.Surface(size).convert()
+    flash.fill((255, 215, 0))  # Gold color
+    
+    # Frame and subtle grid lines on a color-keyed surface (lines are 1px past the cells)
+    key_color = (255, 0, 255)
+    lines = pygame.Surface((size[0] + 1, size[1] + 1)).convert()
+    lines.fill(key_color)
+    lines.set_colorkey(key_color)
+    draw_border(lines, WHITE, (0, 0, size[0], size[1]), 2)
+    for x in range(GRID_WIDTH + 1):
+        pygame.draw.line(lines, GRAY, (x * BLOCK_SIZE, 0), (x * BLOCK_SIZE, size[1]), 1)
+    for y in range(GRID_HEIGHT + 1):
+        pygame.draw.line(lines, GRAY, (0, y * BLOCK_SIZE), (size[0], y * BLOCK_SIZE), 1)
+    
+    return background, flash, lines
 
 
 class ParticleSystem:
-    """Manages all particles"""
-    
-    def __init__(self):
-        self.particles = []
+    """Fixed-capacity particle pool stored in parallel NumPy arrays
+    
+    Slots are recycled instead of allocated: each slot owns a small sprite
+    that is filled with the particle's color when the slot is reused, and
+    drawing blits just the part of it matching the particle's current size.
+    New particles beyond the capacity are dropped.
+    """
+    
+    MAX_SIZE = 8  # Largest particle half-size in pixels
+    
+    def __init__(self, seed=None, capacity=MAX_PARTICLES):
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.velocity_x = np.zeros(capacity)
+        self.velocity_y = np.zeros(capacity)
+        self.lifetime = np.zeros(capacity)
+        self.max_lifetime = np.ones(capacity)
+        self.size = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        
+        # Milliseconds since the last update; drawing moves particles ahead by
+        # this much so motion stays smooth between logic ticks
+        self.lead_time = 0
+        
+        # One sprite per slot, big enough for the largest particle
+        sprite_size = self.MAX_SIZE * 2
+        self.sprites = [pygame.Surface((sprite_size, sprite_size)).convert() for _ in range(capacity)]
+        self.reset(seed)
+    
+    def reset(self, seed=None):
+        """Removes all particles and reseeds the random generator (slots are kept)"""
+        self.alive[:] = False
+        # Own random generator so effects are reproducible per game
+        self.rng = np.random.default_rng(seed)
+    
+    def __len__(self):
+        return int(np.count_nonzero(self.alive))
+    
+    def spawn(self, x, y, velocity_x, velocity_y, lifetime, colors):
+        """Puts new particles into free slots (arrays of equal length; extras are dropped)"""
+        slots = np.flatnonzero(~self.alive)[:len(x)]
+        count = len(slots)
+        if count == 0:
+            return
+        
+        self.x[slots] = x[:count]
+        self.y[slots] = y[:count]
+        self.velocity_x[slots] = velocity_x[:count]
+        self.velocity_y[slots] = velocity_y[:count]
+        self.lifetime[slots] = lifetime[:count]
+        self.max_lifetime[slots] = lifetime[:count]
+        self.size[slots] = self.rng.integers(3, 9, count)
+        self.alive[slots] = True
+        for slot, color in zip(slots, colors[:count]):
+            self.sprites[slot].fill(tuple(color))
     
     def add_line_clear_particles(self, grid_y, grid_width, block_size, offset_x, offset_y):
         """Create particles for a cleared line"""
-        for x in range(grid_width):
-            pixel_x = x * block_size
-            pixel_y = grid_y * block_size
-            
-            # Create multiple particles per block
-            for _ in range(3):
-                velocity_x = random.uniform(-3, 3)
-                velocity_y = random.uniform(-5, -2)
-                color = (random.randint(100, 255), random.randint(100, 255), random.randint(100, 255))
-                lifetime = random.uniform(300, 600)
-                
-                particle = Particle(pixel_x, pixel_y, color, velocity_x, velocity_y, lifetime)
-                self.particles.append(particle)
+        # Create multiple particles per block
+        count = grid_width * 3
+        pixel_x = np.repeat(np.arange(grid_width) * block_size, 3).astype(float)
+        pixel_y = np.full(count, float(grid_y * block_size))
+        velocity_x = self.rng.uniform(-3, 3, count)
+        velocity_y = self.rng.uniform(-5, -2, count)
+        colors = self.rng.integers(100, 256, (count, 3))
+        lifetime = self.rng.uniform(300, 600, count)
+        self.spawn(pixel_x, pixel_y, velocity_x, velocity_y, lifetime, colors)
     
     def add_level_up_particles(self, center_x, center_y):
         """Create particles for level up"""
-        for _ in range(30):
-            angle = random.uniform(0, 2 * 3.14159)
-            speed = random.uniform(2, 6)
-            velocity_x = speed * (angle ** 0.5)  # Use angle for variation
-            velocity_y = speed * ((angle + 1) ** 0.5)
-            color = (255, random.randint(150, 255), random.randint(0, 100))
-            lifetime = random.uniform(400, 800)
-            
-            particle = Particle(center_x, center_y, color, velocity_x, velocity_y, lifetime)
-            self.particles.append(particle)
+        count = 30
+        angle = self.rng.uniform(0, 2 * 3.14159, count)
+        speed = self.rng.uniform(2, 6, count)
+        velocity_x = speed * (angle ** 0.5)  # Use angle for variation
+        velocity_y = speed * ((angle + 1) ** 0.5)
+        colors = np.empty((count, 3), dtype=np.int64)
+        colors[:, 0] = 255
+        colors[:, 1] = self.rng.integers(150, 256, count)
+        colors[:, 2] = self.rng.integers(0, 101, count)
+        lifetime = self.rng.uniform(400, 800, count)
+        self.spawn(np.full(count, float(center_x)), np.full(count, float(center_y)),
+                   velocity_x, velocity_y, lifetime, colors)
     
     def update(self, delta_time):
         """Update all particles"""
-        self.particles = [p for p in self.particles if p.update(delta_time)]
+        alive = self.alive
+        self.x[alive] += self.velocity_x[alive] * delta_time / 16.67  # Normalize to ~60fps
+        self.y[alive] += self.velocity_y[alive] * delta_time / 16.67
+        self.lifetime[alive] -= delta_time
+        alive &= self.lifetime > 0  # Expired slots become free
+    
+    def visible(self, offset_x, offset_y):
+        """Returns (slots, left, top, sizes, alphas) for particles big enough to draw"""
+        slots = np.flatnonzero(self.alive)
+        fraction = self.lifetime[slots] / self.max_lifetime[slots]
+        sizes = (self.size[slots] * fraction).astype(np.int32)
+        shown = sizes > 0
+        slots, fraction, sizes = slots[shown], fraction[shown], sizes[shown]
+        alphas = (255 * fraction).astype(np.int32)
+        lead = self.lead_time / 16.67
+        left = (self.x[slots] + self.velocity_x[slots] * lead + offset_x - sizes).astype(np.int32)
+        top = (self.y[slots] + self.velocity_y[slots] * lead + offset_y - sizes).astype(np.int32)
+        return slots, left, top, sizes, alphas
     
     def draw(self, screen, offset_x, offset_y):
         """Draw all particles"""
-        for particle in self.particles:
-            particle.draw(screen, offset_x, offset_y)
+        slots, left, top, sizes, alphas = self.visible(offset_x, offset_y)
+        blits = []
+        for slot, x, y, size, alpha in zip(slots.tolist(), left.tolist(), top.tolist(),
+                                           sizes.tolist(), alphas.tolist()):
+            sprite = self.sprites[slot]
+            sprite.set_alpha(alpha)
+            blits.append((sprite, (x, y), (0, 0, size * 2, size * 2)))
+        screen.blits(blits, doreturn=False)
+    
+    def get_rects(self, offset_x, offset_y):
+        """Returns the screen areas covered by the live particles"""
+        _, left, top, sizes, _ = self.visible(offset_x, offset_y)
+        return [pygame.Rect(x, y, size * 2, size * 2)
+                for x, y, size in zip(left.tolist(), top.tolist(), sizes.tolist())]
 
 
-class TetrisGame:
-    """Main game class that handles all game logic"""
+class TextCache:
+    """Rendered text surfaces per label, re-rendered only when the text or color changes"""
     
     def __init__(self):
+        self.labels = {}
+    
+    def render(self, label, font, text, color):
+        """Returns the surface for a label, rendering it again only if text or color changed"""
+        entry = self.labels.get(label)
+        if entry is None or entry[0] != text or entry[1] != color:
+            entry = (text, color, font.render(text, True, color))
+            self.labels[label] = entry
+        return entry[2]
+
+
+class DirtyRegionTracker:
+    """Remembers what was drawn last frame and reports the screen areas that changed"""
+    
+    def __init__(self):
+        self.full_redraw = True
+        self.board = None
+        self.board_version = -1
+        self.drawn_rows = [None] * GRID_HEIGHT
+        self.piece_cells = ()
+        self.ghost_cells = ()
+        self.ui_state = None
+        self.particle_rects = []
+        self.flashing = False
+        self.profiler_shown = False
+        self.game_over = False
+    
+    def invalidate(self):
+        """Forces the next frame to be redrawn completely"""
+        self.full_redraw = True
+    
+    @staticmethod
+    def cell_rects(cells):
+        """Screen rectangles of the given grid cells"""
+        return [pygame.Rect(GAME_AREA_X + x * BLOCK_SIZE, GAME_AREA_Y + y * BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)
+                for x, y in cells if y >= 0]
+    
+    def collect(self, game):
+        """Returns the list of screen rectangles that must be redrawn this frame"""
+        rects = []
+        
+        # Game over overlay covers the whole screen when it appears or disappears
+        if game.game_over != self.game_over:
+            self.game_over = game.game_over
+            self.full_redraw = True
+        
+        # Changed rows of the board (placed blocks and cleared lines)
+        if game.board is not self.board or game.board.version != self.board_version:
+            self.board = game.board
+            self.board_version = game.board.version
+            for y, row in enumerate(game.grid):
+                row = tuple(row)
+                if row != self.drawn_rows[y]:
+                    self.drawn_rows[y] = row
+                    rects.append(pygame.Rect(GAME_AREA_X, GAME_AREA_Y + y * BLOCK_SIZE,
+                                             GRID_WIDTH * BLOCK_SIZE, BLOCK_SIZE))
+        
+        # Falling piece and its ghost: old and new cells
+        piece_cells = game.current_piece.get_blocks()  # Already a tuple of (x, y) tuples
+        if piece_cells != self.piece_cells:
+            rects.extend(self.cell_rects(self.piece_cells + piece_cells))
+            self.piece_cells = piece_cells
+        ghost = game.get_ghost_piece()
+        ghost_cells = ghost.get_blocks() if ghost else ()
+        if ghost_cells != self.ghost_cells:
+            rects.extend(self.cell_rects(self.ghost_cells + ghost_cells))
+            self.ghost_cells = ghost_cells
+        
+        # Score, level, lines and the upcoming pieces
+        ui_state = (game.score, game.high_score, game.new_high_score, game.level,
+                    game.lines_cleared, tuple(game.upcoming_pieces(game.preview_count)))
+        if ui_state != self.ui_state:
+            self.ui_state = ui_state
+            rects.append(HEADER_RECT)
+            rects.append(SIDEBAR_RECT)
+        
+        # Level up flash tints the whole playfield while it fades
+        flashing = game.level_up_flash > 0
+        if flashing or self.flashing:
+            rects.append(PLAYFIELD_RECT)
+        self.flashing = flashing
+        
+        # Profiler overlay numbers change all the time while it is shown
+        if game.show_profiler or self.profiler_shown:
+            rects.append(PROFILER_RECT)
+        self.profiler_shown = game.show_profiler
+        
+        # Particles: where they were and where they are now
+        particle_rects = game.particles.get_rects(0, 0)
+        rects.extend(self.particle_rects)
+        rects.extend(particle_rects)
+        self.particle_rects = particle_rects
+        
+        if self.full_redraw:
+            self.full_redraw = False
+            return [game.screen.get_rect()]
+        return rects
+
+
+class TetrisGame(TetrisEngine):
+    """Pygame front end: draws the engine state and feeds it keyboard input"""
+    
+    def __init__(self, use_srs_kicks=False, seed=None, dirty_rendering=False,
+                 max_particles=MAX_PARTICLES, record_path=None, player='Player',
+                 tick_rate=TICK_RATE, max_fps=MAX_FPS, profile_path=None,
+                 high_score_db=HIGH_SCORE_DB, controller=None, preview_count=PREVIEW_COUNT):
         # Create the game window
+        pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption('Classic Tetris - Enhanced')
         self.clock = pygame.time.Clock()
         
-        # Game state
-        self.grid = [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.current_piece = None
-        self.next_piece_name = None
-        self.piece_bag = PieceBag()
-        self.game_over = False
-        self.score = 0
+        # Logic advances in fixed ticks no matter how long a frame takes
+        self.timestep = FixedTimestep(tick_rate)
+        self.max_fps = max_fps
+        
+        # How many upcoming pieces the sidebar shows (at least the next one)
+        self.preview_count = max(1, preview_count)
+        
+        # Optional bot (see tetris_ai.AIController) that plays instead of the keyboard
+        self.controller = controller
+        
+        # Frame profiler: on with --profile (every frame kept and written to profile_path
+        # at exit) or while the F3 overlay is open (only the rolling window is kept)
+        self.profiler = FrameProfiler(enabled=profile_path is not None,
+                                      keep_history=profile_path is not None)
+        self.profile_path = profile_path
+        self.show_profiler = False
+        self.profiler_surface = None
+        self.profiler_refresh = 0
+        
+        # Dirty rendering only redraws and pushes the screen areas that changed
+        self.dirty_rendering = dirty_rendering
+        self.dirty_regions = DirtyRegionTracker()
+        
+        # Leaderboard (saved in the background); each game updates its own entry
+        self.player = player
+        self.scores = HighScoreStore(high_score_db, legacy_json=HIGH_SCORE_FILE)
+        self.game_id = new_game_id()
         self.high_score = self.load_high_score()
-        self.level = 1
-        self.lines_cleared = 0
-        
-        # Timing (piece falls automatically)
-        self.fall_time = 0
-        self.fall_speed = 500  # Milliseconds between automatic drops (gets faster with levels)
         
         # DAS (Delayed Auto Shift) for smooth movement
         self.das_delay = 170  # Initial delay before repeating (ms)
@@ -251,9 +388,22 @@ class TetrisGame:
         # Font for displaying text
         self.font = pygame.font.Font(None, 36)
         self.small_font = pygame.font.Font(None, 24)
+        self.profiler_font = pygame.font.Font(None, 20)
+        
+        # Rendered text is cached; the instruction panel and game over overlay are built once
+        self.text_cache = TextCache()
+        self.instruction_labels = self.build_instruction_labels()
+        self.game_over_overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        self.game_over_overlay.fill(BLACK)
+        self.game_over_overlay.set_alpha(200)
         
-        # Particle system for visual effects
-        self.particles = ParticleSystem()
+        # Cached block sprites and static playfield layers (drawing is just blits)
+        self.block_sprites = BlockSprites()
+        self.playfield_background, self.flash_surface, self.grid_lines = build_playfield_layers()
+        
+        # Particle system for visual effects (seeded once the engine has picked the game seed)
+        self.max_particles = max_particles
+        self.particles = None
         
         # Animation states
         self.line_clear_animation = []  # List of (y_position, timer) for flashing lines
@@ -261,248 +411,94 @@ class TetrisGame:
         self.level_up_flash = 0  # Timer for level up flash effect
         self.new_high_score = False  # Flag for new high score achievement
         
-        # Spawn the first piece and prepare next piece
-        self.next_piece_name = self.piece_bag.get_next_piece()
-        self.spawn_piece()
+        # Game state (grid, pieces, score) lives in the engine
+        super().__init__(use_srs_kicks, seed)
+        self.particles = ParticleSystem(self.seed, self.max_particles)
+        
+        # Record every input to a replay file (written when the window closes)
+        self.record_path = record_path
+        if record_path:
+            self.recorder = ReplayRecorder(self.seed, use_srs_kicks)
     
     def load_high_score(self):
-        """Load high score from file"""
-        try:
-            if os.path.exists(HIGH_SCORE_FILE):
-                with open(HIGH_SCORE_FILE, 'r') as f:
-                    data = json.load(f)
-                    return data.get('high_score', 0)
-        except:
-            pass
-        return 0
+        """Load the best score on the leaderboard"""
+        return self.scores.best_score()
     
     def save_high_score(self):
-        """Save high score to file"""
-        try:
-            with open(HIGH_SCORE_FILE, 'w') as f:
-                json.dump({'high_score': self.high_score}, f)
-        except:
-            pass
+        """Queue this game's current result for the leaderboard (written in the background)"""
+        self.scores.submit(self.game_id, self.player, self.score, self.lines_cleared, self.level)
     
     def update_high_score(self):
         """Check and update high score if current score is higher"""
         if self.score > self.high_score:
             self.high_score = self.score
             self.new_high_score = True
+        if self.score > 0:
             self.save_high_score()
     
-    def spawn_piece(self):
-        """Creates a new piece at the top of the grid"""
-        self.current_piece = Tetromino(self.next_piece_name)
-        self.next_piece_name = self.piece_bag.get_next_piece()
+    def on_lines_cleared(self, cleared_rows, leveled_up):
+        """Adds line clear effects and checks the high score"""
+        # Add particles for cleared lines
+        for y in cleared_rows:
+            self.particles.add_line_clear_particles(y, GRID_WIDTH, BLOCK_SIZE, GAME_AREA_X, GAME_AREA_Y)
+        
+        # Check for high score
+        self.update_high_score()
         
-        # Check if the new piece immediately collides (game over condition)
-        if self.check_collision(self.current_piece):
-            self.game_over = True
+        # Check if leveled up
+        if leveled_up:
+            self.level_up_flash = 500  # Flash for 500ms
+            # Add level up particles
+            center_x = GAME_AREA_X + (GRID_WIDTH * BLOCK_SIZE) // 2
+            center_y = GAME_AREA_Y + (GRID_HEIGHT * BLOCK_SIZE) // 2
+            self.particles.add_level_up_particles(center_x, center_y)
+    
+    def on_piece_dropped(self):
+        """Checks if a hard drop beat the high score"""
+        self.update_high_score()
     
     def check_collision(self, piece, offset_x=0, offset_y=0):
-        """Checks if a piece collides with the grid or boundaries"""
-        for block in piece.get_blocks():
-            x = block[0] + offset_x
-            y = block[1] + offset_y
-            
-            # Check boundaries
-            if x < 0 or x >= GRID_WIDTH or y >= GRID_HEIGHT:
-                return True
-            
-            # Check collision with placed blocks (but not if above the grid)
-            if y >= 0 and self.grid[y][x] is not None:
-                return True
-        
-        return False
-    
-    def get_ghost_piece(self):
-        """Returns a copy of the current piece at its drop position"""
-        if not self.current_piece:
-            return None
-        
-        ghost = self.current_piece.copy()
-        
-        # Move the ghost piece down until it collides
-        while not self.check_collision(ghost, 0, 1):
-            ghost.y += 1
-        
-        return ghost
-    
-    def move_piece(self, dx, dy):
-        """Attempts to move the current piece by dx, dy"""
-        if not self.check_collision(self.current_piece, dx, dy):
-            self.current_piece.x += dx
-            self.current_piece.y += dy
-            return True
-        return False
-    
-    def rotate_piece(self):
-        """Attempts to rotate the current piece using SRS wall kicks with visual centering"""
-        if self.current_piece.shape_name == 'O':
-            return  # O piece doesn't rotate
-        
-        # Save the old state in case all rotations fail
-        old_shape = [block[:] for block in self.current_piece.shape]
-        old_rotation_state = self.current_piece.rotation_state
-        old_x = self.current_piece.x
-        old_y = self.current_piece.y
-        
-        # Calculate center of mass before rotation
-        center_x_before = sum(block[0] for block in old_shape) / len(old_shape)
-        center_y_before = sum(block[1] for block in old_shape) / len(old_shape)
-        
-        # Perform the rotation
-        self.current_piece.rotate()
-        
-        # Calculate center of mass after rotation
-        center_x_after = sum(block[0] for block in self.current_piece.shape) / len(self.current_piece.shape)
-        center_y_after = sum(block[1] for block in self.current_piece.shape) / len(self.current_piece.shape)
-        
-        # Calculate offset to keep piece visually centered
-        center_offset_x = round(center_x_before - center_x_after)
-        center_offset_y = round(center_y_before - center_y_after)
-        
-        # Apply centering offset
-        self.current_piece.x += center_offset_x
-        self.current_piece.y += center_offset_y
-        
-        # Now try wall kicks if needed (with much simpler kick table since we're already centered)
-        new_rotation_state = self.current_piece.rotation_state
-        kick_key = (old_rotation_state, new_rotation_state)
-        
-        # Simplified kicks - just try in place, then ±1 left/right
-        kick_tests = [(0, 0), (-1, 0), (1, 0), (0, -1)]
-        
-        # Try each wall kick offset
-        for offset_x, offset_y in kick_tests:
-            if not self.check_collision(self.current_piece, offset_x, offset_y):
-                # This kick works! Apply the offset
-                self.current_piece.x += offset_x
-                self.current_piece.y += offset_y
-                return  # Success!
-        
-        # All wall kicks failed, revert everything
-        self.current_piece.shape = old_shape
-        self.current_piece.rotation_state = old_rotation_state
-        self.current_piece.x = old_x
-        self.current_piece.y = old_y
+        """Engine collision check, counted by the profiler"""
+        self.profiler.count('check_collision')
+        return super().check_collision(piece, offset_x, offset_y)
     
     def lock_piece(self):
-        """Locks the current piece into the grid"""
-        for block in self.current_piece.get_blocks():
-            x, y = block[0], block[1]
-            if 0 <= y < GRID_HEIGHT:
-                self.grid[y][x] = self.current_piece.color
-        
-        # Check for completed lines
-        self.clear_lines()
-        
-        # Spawn a new piece
-        self.spawn_piece()
-    
-    def clear_lines(self):
-        """Removes completed lines and updates score"""
-        lines_to_clear = []
-        
-        # Find all completed lines
-        for y in range(GRID_HEIGHT):
-            if all(self.grid[y][x] is not None for x in range(GRID_WIDTH)):
-                lines_to_clear.append(y)
-        
-        # Add particles for cleared lines
-        if lines_to_clear:
-            for y in lines_to_clear:
-                self.particles.add_line_clear_particles(y, GRID_WIDTH, BLOCK_SIZE, GAME_AREA_X, GAME_AREA_Y)
-        
-        # Remove completed lines and add empty lines at the top
-        for y in lines_to_clear:
-            del self.grid[y]
-            self.grid.insert(0, [None for _ in range(GRID_WIDTH)])
-        
-        # Update score and level
-        if lines_to_clear:
-            old_level = self.level
-            self.lines_cleared += len(lines_to_clear)
-            # Classic Tetris scoring: 1 line=100, 2=300, 3=500, 4=800
-            points = [0, 100, 300, 500, 800]
-            self.score += points[len(lines_to_clear)] * self.level
-            
-            # Check for high score
-            self.update_high_score()
-            
-            # Increase level every 10 lines
-            self.level = self.lines_cleared // 10 + 1
-            
-            # Check if leveled up
-            if self.level > old_level:
-                self.level_up_flash = 500  # Flash for 500ms
-                # Add level up particles
-                center_x = GAME_AREA_X + (GRID_WIDTH * BLOCK_SIZE) // 2
-                center_y = GAME_AREA_Y + (GRID_HEIGHT * BLOCK_SIZE) // 2
-                self.particles.add_level_up_particles(center_x, center_y)
-            
-            # Make pieces fall faster as level increases
-            self.fall_speed = max(100, 500 - (self.level - 1) * 50)
+        """Engine lock_piece, timed by the profiler"""
+        with self.profiler.phase('lock_piece'):
+            super().lock_piece()
     
-    def drop_piece(self):
-        """Instantly drops the piece to the bottom"""
-        while self.move_piece(0, 1):
-            self.score += 1  # Small bonus for hard dropping
-        self.update_high_score()  # Check if we beat high score
-        self.lock_piece()
+    def clear_lines(self, rows_to_check=None):
+        """Engine clear_lines, timed by the profiler"""
+        with self.profiler.phase('clear_lines'):
+            return super().clear_lines(rows_to_check)
     
     def draw_grid(self):
         """Draws the game grid and all placed blocks"""
         # Draw the grid background
-        grid_rect = pygame.Rect(GAME_AREA_X, GAME_AREA_Y, 
-                               GRID_WIDTH * BLOCK_SIZE, GRID_HEIGHT * BLOCK_SIZE)
-        pygame.draw.rect(self.screen, BLACK, grid_rect)
+        self.screen.blit(self.playfield_background, (GAME_AREA_X, GAME_AREA_Y))
         
         # Level up flash effect
         if self.level_up_flash > 0:
-            flash_alpha = int(100 * (self.level_up_flash / 500))
-            flash_surface = pygame.Surface((GRID_WIDTH * BLOCK_SIZE, GRID_HEIGHT * BLOCK_SIZE))
-            flash_surface.set_alpha(flash_alpha)
-            flash_surface.fill((255, 215, 0))  # Gold color
-            self.screen.blit(flash_surface, (GAME_AREA_X, GAME_AREA_Y))
+            self.flash_surface.set_alpha(int(100 * (self.level_up_flash / 500)))
+            self.screen.blit(self.flash_surface, (GAME_AREA_X, GAME_AREA_Y))
         
-        pygame.draw.rect(self.screen, WHITE, grid_rect, 2)
+        # Frame and grid lines (blocks never overlap the lines, so they can go first)
+        self.screen.blit(self.grid_lines, (GAME_AREA_X, GAME_AREA_Y))
         
         # Draw placed blocks
+        rows = self.board.rows
         for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if self.grid[y][x] is not None:
-                    self.draw_block(x, y, self.grid[y][x])
-        
-        # Draw grid lines (subtle)
-        for x in range(GRID_WIDTH + 1):
-            start_pos = (GAME_AREA_X + x * BLOCK_SIZE, GAME_AREA_Y)
-            end_pos = (GAME_AREA_X + x * BLOCK_SIZE, GAME_AREA_Y + GRID_HEIGHT * BLOCK_SIZE)
-            pygame.draw.line(self.screen, GRAY, start_pos, end_pos, 1)
-        
-        for y in range(GRID_HEIGHT + 1):
-            start_pos = (GAME_AREA_X, GAME_AREA_Y + y * BLOCK_SIZE)
-            end_pos = (GAME_AREA_X + GRID_WIDTH * BLOCK_SIZE, GAME_AREA_Y + y * BLOCK_SIZE)
-            pygame.draw.line(self.screen, GRAY, start_pos, end_pos, 1)
+            if rows[y]:
+                grid_row = self.grid[y]
+                for x in range(GRID_WIDTH):
+                    if grid_row[x] is not None:
+                        self.draw_block(x, y, grid_row[x])
     
     def draw_block(self, grid_x, grid_y, color, alpha=255):
         """Draws a single block at the given grid position"""
         pixel_x = GAME_AREA_X + grid_x * BLOCK_SIZE
         pixel_y = GAME_AREA_Y + grid_y * BLOCK_SIZE
-        
-        # Create a surface for transparency support
-        block_surface = pygame.Surface((BLOCK_SIZE - 2, BLOCK_SIZE - 2))
-        block_surface.set_alpha(alpha)
-        block_surface.fill(color)
-        
-        # Draw the main block
-        self.screen.blit(block_surface, (pixel_x + 1, pixel_y + 1))
-        
-        # Draw a border for depth (only for solid blocks)
-        if alpha == 255:
-            pygame.draw.rect(self.screen, WHITE, 
-                            (pixel_x + 1, pixel_y + 1, BLOCK_SIZE - 2, BLOCK_SIZE - 2), 2)
+        self.screen.blit(self.block_sprites.get(color, alpha), (pixel_x + 1, pixel_y + 1))
     
     def draw_ghost_piece(self):
         """Draws the ghost piece (shadow) showing where the piece will land"""
@@ -519,8 +515,29 @@ class TetrisGame:
                 if block[1] >= 0:  # Only draw blocks that are visible
                     self.draw_block(block[0], block[1], self.current_piece.color)
     
+    def draw_preview_piece(self, shape_name, box_x, box_y, box_width, box_height, block_size):
+        """Draws a piece in its spawn rotation centered in a box, from the cached sprites"""
+        blocks = ROTATION_TABLE[shape_name][0].cells
+        
+        # Calculate bounds of the piece to center it
+        min_x = min(block[0] for block in blocks)
+        max_x = max(block[0] for block in blocks)
+        min_y = min(block[1] for block in blocks)
+        max_y = max(block[1] for block in blocks)
+        
+        piece_width = (max_x - min_x + 1) * block_size
+        piece_height = (max_y - min_y + 1) * block_size
+        
+        # Center the piece in the box
+        offset_x = box_x + (box_width - piece_width) // 2 - min_x * block_size
+        offset_y = box_y + (box_height - piece_height) // 2 - min_y * block_size
+        
+        sprite = self.block_sprites.get(SHAPE_COLORS[shape_name], size=block_size)
+        self.screen.blits([(sprite, (offset_x + block[0] * block_size + 1, offset_y + block[1] * block_size + 1))
+                           for block in blocks], doreturn=False)
+    
     def draw_next_piece(self):
-        """Draws the next piece preview"""
+        """Draws the next piece preview and the smaller queue after it"""
         # Draw the preview box
         preview_x = GAME_AREA_X + GRID_WIDTH * BLOCK_SIZE + 30
         preview_y = GAME_AREA_Y + 50
@@ -530,234 +547,370 @@ class TetrisGame:
         # Box background
         preview_rect = pygame.Rect(preview_x, preview_y, preview_width, preview_height)
         pygame.draw.rect(self.screen, DARK_GRAY, preview_rect)
-        pygame.draw.rect(self.screen, WHITE, preview_rect, 2)
+        draw_border(self.screen, WHITE, preview_rect, 2)
         
         # "Next" label
-        next_text = self.small_font.render('NEXT', True, WHITE)
+        next_text = self.text_cache.render('next', self.small_font, 'NEXT', WHITE)
         text_rect = next_text.get_rect(center=(preview_x + preview_width // 2, preview_y - 20))
         self.screen.blit(next_text, text_rect)
         
         # Draw the next piece centered in the preview box
-        next_piece = Tetromino(self.next_piece_name)
-        
-        # Calculate bounds of the piece to center it
-        blocks = next_piece.shape
-        min_x = min(block[0] for block in blocks)
-        max_x = max(block[0] for block in blocks)
-        min_y = min(block[1] for block in blocks)
-        max_y = max(block[1] for block in blocks)
-        
-        piece_width = (max_x - min_x + 1) * BLOCK_SIZE
-        piece_height = (max_y - min_y + 1) * BLOCK_SIZE
-        
-        # Center the piece in the preview box
-        offset_x = preview_x + (preview_width - piece_width) // 2 - min_x * BLOCK_SIZE
-        offset_y = preview_y + (preview_height - piece_height) // 2 - min_y * BLOCK_SIZE
-        
-        for block in blocks:
-            pixel_x = offset_x + block[0] * BLOCK_SIZE
-            pixel_y = offset_y + block[1] * BLOCK_SIZE
-            
-            # Draw the block
-            pygame.draw.rect(self.screen, next_piece.color,
-                           (pixel_x + 1, pixel_y + 1, BLOCK_SIZE - 2, BLOCK_SIZE - 2))
-            pygame.draw.rect(self.screen, WHITE,
-                           (pixel_x + 1, pixel_y + 1, BLOCK_SIZE - 2, BLOCK_SIZE - 2), 2)
+        upcoming = self.upcoming_pieces(self.preview_count)
+        self.draw_preview_piece(upcoming[0], preview_x, preview_y, preview_width, preview_height, BLOCK_SIZE)
+        
+        # The pieces after it, stacked in small slots below the instructions
+        slot_height = 3 * PREVIEW_BLOCK_SIZE + 10
+        for index, shape_name in enumerate(upcoming[1:]):
+            slot_y = QUEUE_Y + index * slot_height
+            if slot_y + slot_height > SCREEN_HEIGHT:
+                break  # No room left in the sidebar
+            self.draw_preview_piece(shape_name, preview_x, slot_y, preview_width, slot_height,
+                                    PREVIEW_BLOCK_SIZE)
+    
+    def build_instruction_labels(self):
+        """Renders the static instruction text once, returning (surface, position) pairs"""
+        # Instructions (moved to right side, below stats)
+        info_x = GAME_AREA_X + GRID_WIDTH * BLOCK_SIZE + 30
+        instructions = [
+            'Arrow Keys: Move',
+            'Up: Rotate',
+            'Space: Drop',
+            'R: Restart',
+            'F3: Profiler'
+        ]
+        labels = []
+        y_offset = INSTRUCTIONS_Y  # Start below the level/lines stats
+        for instruction in instructions:
+            labels.append((self.small_font.render(instruction, True, WHITE), (info_x, y_offset)))
+            y_offset += 25
+        return labels
     
     def draw_ui(self):
         """Draws the score, level, and instructions"""
         # Score
-        score_text = self.font.render(f'Score: {self.score}', True, WHITE)
+        score_text = self.text_cache.render('score', self.font, f'Score: {self.score}', WHITE)
         self.screen.blit(score_text, (20, 10))
         
         # High Score (below current score)
         high_score_color = (255, 215, 0) if self.new_high_score else WHITE  # Gold if new high score
-        high_score_text = self.small_font.render(f'High: {self.high_score}', True, high_score_color)
+        high_score_text = self.text_cache.render('high', self.small_font, f'High: {self.high_score}',
+                                                 high_score_color)
         self.screen.blit(high_score_text, (20, 45))
         
         # Level (right side)
         info_x = GAME_AREA_X + GRID_WIDTH * BLOCK_SIZE + 30
-        level_text = self.small_font.render(f'Level: {self.level}', True, WHITE)
-        self.screen.blit(level_text, (info_x, 200))
+        level_text = self.text_cache.render('level', self.small_font, f'Level: {self.level}', WHITE)
+        self.screen.blit(level_text, (info_x, 235))
         
         # Lines
-        lines_text = self.small_font.render(f'Lines: {self.lines_cleared}', True, WHITE)
-        self.screen.blit(lines_text, (info_x, 230))
+        lines_text = self.text_cache.render('lines', self.small_font, f'Lines: {self.lines_cleared}', WHITE)
+        self.screen.blit(lines_text, (info_x, 260))
         
-        # Instructions (moved to right side, below stats)
-        instructions = [
-            'Arrow Keys: Move',
-            'Up: Rotate',
-            'Space: Drop',
-            'R: Restart'
-        ]
-        y_offset = 280  # Start below the level/lines stats
-        for instruction in instructions:
-            text = self.small_font.render(instruction, True, WHITE)
-            self.screen.blit(text, (info_x, y_offset))
-            y_offset += 25
+        # Instructions (pre-rendered)
+        self.screen.blits(self.instruction_labels, doreturn=False)
     
     def draw_game_over(self):
         """Draws the game over screen"""
-        # Semi-transparent overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(200)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        # Semi-transparent overlay (built once)
+        self.screen.blit(self.game_over_overlay, (0, 0))
         
         # Game Over text
-        game_over_text = self.font.render('GAME OVER', True, RED)
+        game_over_text = self.text_cache.render('game_over', self.font, 'GAME OVER', RED)
         text_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 60))
         self.screen.blit(game_over_text, text_rect)
         
         # New High Score message if applicable
         if self.new_high_score:
-            new_high_text = self.font.render('NEW HIGH SCORE!', True, (255, 215, 0))
+            new_high_text = self.text_cache.render('new_high', self.font, 'NEW HIGH SCORE!', (255, 215, 0))
             high_rect = new_high_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20))
             self.screen.blit(new_high_text, high_rect)
         
         # Final score
         score_y = SCREEN_HEIGHT // 2 + 20 if self.new_high_score else SCREEN_HEIGHT // 2 + 10
-        score_text = self.font.render(f'Score: {self.score}', True, WHITE)
+        score_text = self.text_cache.render('final_score', self.font, f'Score: {self.score}', WHITE)
         score_rect = score_text.get_rect(center=(SCREEN_WIDTH // 2, score_y))
         self.screen.blit(score_text, score_rect)
         
         # High score (if not new high score)
         if not self.new_high_score:
-            high_text = self.small_font.render(f'High Score: {self.high_score}', True, WHITE)
+            high_text = self.text_cache.render('final_high', self.small_font,
+                                               f'High Score: {self.high_score}', WHITE)
             high_rect = high_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50))
             self.screen.blit(high_text, high_rect)
         
         # Restart instruction
         restart_y = SCREEN_HEIGHT // 2 + 90
-        restart_text = self.small_font.render('Press R to Restart', True, WHITE)
+        restart_text = self.text_cache.render('restart', self.small_font, 'Press R to Restart', WHITE)
         restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH // 2, restart_y))
         self.screen.blit(restart_text, restart_rect)
     
-    def reset_game(self):
+    def reset_game(self, seed=None):
         """Resets the game to initial state"""
-        self.grid = [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.game_over = False
-        self.score = 0
+        super().reset_game(seed)
+        self.game_id = new_game_id()  # The finished game keeps its leaderboard entry
         self.new_high_score = False  # Reset the flag, but keep the high_score value
-        self.level = 1
-        self.lines_cleared = 0
-        self.fall_speed = 500
-        self.piece_bag = PieceBag()
-        self.particles = ParticleSystem()
+        self.particles.reset(self.seed)
         self.level_up_flash = 0
         self.das_timer = 0
         self.das_direction = None
-        self.next_piece_name = self.piece_bag.get_next_piece()
-        self.spawn_piece()
-    
-    def run(self):
-        """Main game loop"""
-        running = True
-        
-        while running:
-            # Calculate time since last frame
-            delta_time = self.clock.tick(60)  # 60 FPS
-            
-            # Handle events (keyboard input)
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                
-                if event.type == pygame.KEYDOWN:
-                    if self.game_over:
-                        if event.key == pygame.K_r:
-                            self.reset_game()
-                    else:
-                        if event.key == pygame.K_LEFT:
-                            self.move_piece(-1, 0)
-                            self.das_direction = 'left'
-                            self.das_timer = 0
-                            self.key_pressed = True
-                        elif event.key == pygame.K_RIGHT:
-                            self.move_piece(1, 0)
-                            self.das_direction = 'right'
-                            self.das_timer = 0
-                            self.key_pressed = True
-                        elif event.key == pygame.K_DOWN:
-                            if self.move_piece(0, 1):
-                                self.score += 1  # Small bonus for soft drop
-                            self.das_direction = 'down'
-                            self.das_timer = 0
-                            self.key_pressed = True
-                        elif event.key == pygame.K_UP:
-                            self.rotate_piece()
-                        elif event.key == pygame.K_SPACE:
-                            self.drop_piece()
-                        elif event.key == pygame.K_r:
-                            self.reset_game()
-                
-                if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_LEFT and self.das_direction == 'left':
-                        self.das_direction = None
-                        self.key_pressed = False
-                    elif event.key == pygame.K_RIGHT and self.das_direction == 'right':
-                        self.das_direction = None
-                        self.key_pressed = False
-                    elif event.key == pygame.K_DOWN and self.das_direction == 'down':
-                        self.das_direction = None
-                        self.key_pressed = False
-            
-            # DAS (Delayed Auto Shift) - smooth continuous movement
-            if not self.game_over and self.das_direction and self.key_pressed:
-                self.das_timer += delta_time
-                
-                # Check if we should repeat the movement
-                if self.das_timer >= self.das_delay:
-                    # Calculate how many times to repeat based on elapsed time
-                    repeats = int((self.das_timer - self.das_delay) / self.das_repeat) + 1
-                    self.das_timer = self.das_delay  # Reset to repeat interval
-                    
-                    for _ in range(repeats):
-                        if self.das_direction == 'left':
-                            self.move_piece(-1, 0)
-                        elif self.das_direction == 'right':
-                            self.move_piece(1, 0)
-                        elif self.das_direction == 'down':
-                            if self.move_piece(0, 1):
-                                self.score += 1
-            
-            # Automatic piece falling (only if game is not over)
-            if not self.game_over:
-                self.fall_time += delta_time
-                if self.fall_time >= self.fall_speed:
-                    self.fall_time = 0
-                    if not self.move_piece(0, 1):
-                        self.lock_piece()
-            
-            # Update particles
-            self.particles.update(delta_time)
-            
-            # Update level up flash
-            if self.level_up_flash > 0:
-                self.level_up_flash = max(0, self.level_up_flash - delta_time)
-            
-            # Drawing
-            self.screen.fill(BLACK)
+        self.dirty_regions.invalidate()
+    
+    def draw_profiler_overlay(self):
+        """Draws the rolling p50/p95/p99 of each profiled phase (in ms) and counter"""
+        now = pygame.time.get_ticks()
+        if self.profiler_surface is None or now - self.profiler_refresh >= PROFILER_REFRESH:
+            self.profiler_refresh = now
+            surface = pygame.Surface(PROFILER_RECT.size).convert()
+            surface.fill(BLACK)
+            surface.set_alpha(210)
+            font = self.profiler_font
+            rows = [('phase (ms)', 'p50', 'p95', 'p99')]
+            for name, (p50, p95, p99) in self.profiler.stats().items():
+                if name in COUNTERS:
+                    rows.append((name + ' / frame', f'{p50:.0f}', f'{p95:.0f}', f'{p99:.0f}'))
+                else:
+                    rows.append((name, f'{p50:.2f}', f'{p95:.2f}', f'{p99:.2f}'))
+            for row_number, row in enumerate(rows):
+                color = YELLOW if row_number == 0 else WHITE
+                y = 5 + row_number * 16
+                surface.blit(font.render(row[0], True, color), (8, y))
+                for column, text in enumerate(row[1:]):
+                    label = font.render(text, True, color)
+                    surface.blit(label, (230 + column * 48 - label.get_width(), y))
+            self.profiler_surface = surface
+        self.screen.blit(self.profiler_surface, PROFILER_RECT.topleft)
+    
+    def draw_frame(self):
+        """Draws the whole scene to the screen surface"""
+        profiler = self.profiler
+        self.screen.fill(BLACK)
+        with profiler.phase('draw_grid'):
             self.draw_grid()
+        with profiler.phase('draw_ghost_piece'):
             self.draw_ghost_piece()  # Draw ghost first (behind current piece)
-            self.draw_current_piece()
-            
-            # Draw particles on top of everything
+        self.draw_current_piece()
+        
+        # Draw particles on top of everything
+        with profiler.phase('particle_draw'):
             self.particles.draw(self.screen, 0, 0)
-            
+        
+        with profiler.phase('ui'):
             self.draw_next_piece()
             self.draw_ui()
             
             if self.game_over:
                 self.draw_game_over()
+        
+        if self.show_profiler:
+            self.draw_profiler_overlay()
+    
+    def draw_dirty(self):
+        """Redraws only the changed screen areas and pushes just those to the display"""
+        rects = self.dirty_regions.collect(self)
+        if not rects:
+            return
+        
+        # Clip drawing to the area around the changes; blits outside it are skipped
+        self.screen.set_clip(rects[0].unionall(rects[1:]))
+        self.draw_frame()
+        self.screen.set_clip(None)
+        with self.profiler.phase('flip'):
+            pygame.display.update(rects)
+    
+    def update_das(self, delta_time):
+        """DAS (Delayed Auto Shift) - repeats the held move every das_repeat ms after das_delay"""
+        if self.game_over or not (self.das_direction and self.key_pressed):
+            return
+        
+        self.das_timer += delta_time
+        if self.das_timer >= self.das_delay:
+            # Calculate how many times to repeat based on elapsed time
+            repeats = int((self.das_timer - self.das_delay) / self.das_repeat) + 1
+            self.das_timer -= repeats * self.das_repeat  # Keep the time left over for the next repeat
             
-            pygame.display.flip()
+            for _ in range(repeats):
+                if self.das_direction == 'left':
+                    self.step(ACTION_LEFT, auto_repeat=True)
+                elif self.das_direction == 'right':
+                    self.step(ACTION_RIGHT, auto_repeat=True)
+                elif self.das_direction == 'down':
+                    self.step(ACTION_SOFT_DROP, auto_repeat=True)
+    
+    def tick(self, delta_time):
+        """Advances all game logic by one fixed tick"""
+        profiler = self.profiler
+        if self.controller is not None:
+            self.controller.update(self)
+        with profiler.phase('das'):
+            self.update_das(delta_time)
+        
+        # Automatic piece falling (the engine skips this once the game is over)
+        with profiler.phase('gravity'):
+            self.update(delta_time)
+        
+        # Update particles
+        with profiler.phase('particle_update'):
+            self.particles.update(delta_time)
+        
+        # Update level up flash
+        if self.level_up_flash > 0:
+            self.level_up_flash = max(0, self.level_up_flash - delta_time)
+    
+    def handle_event(self, event):
+        """Handles one pygame event (keyboard input); returns False when the window is closed"""
+        if event.type == pygame.QUIT:
+            return False
+        
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            # The overlay profiles while it's open; with --profile it never stops
+            self.show_profiler = not self.show_profiler
+            self.profiler.enabled = self.show_profiler or self.profile_path is not None
+        elif event.type == pygame.KEYDOWN and self.controller is not None:
+            # The bot does the playing; the keyboard can only restart
+            if event.key == pygame.K_r:
+                self.reset_game()
+        elif event.type == pygame.KEYDOWN:
+            if self.game_over:
+                if event.key == pygame.K_r:
+                    self.reset_game()
+            else:
+                if event.key == pygame.K_LEFT:
+                    self.step(ACTION_LEFT)
+                    self.das_direction = 'left'
+                    self.das_timer = 0
+                    self.key_pressed = True
+                elif event.key == pygame.K_RIGHT:
+                    self.step(ACTION_RIGHT)
+                    self.das_direction = 'right'
+                    self.das_timer = 0
+                    self.key_pressed = True
+                elif event.key == pygame.K_DOWN:
+                    self.step(ACTION_SOFT_DROP)  # Small bonus for soft drop
+                    self.das_direction = 'down'
+                    self.das_timer = 0
+                    self.key_pressed = True
+                elif event.key == pygame.K_UP:
+                    self.step(ACTION_ROTATE)
+                elif event.key == pygame.K_SPACE:
+                    self.step(ACTION_HARD_DROP)
+                elif event.key == pygame.K_r:
+                    self.reset_game()
+        
+        if event.type == pygame.KEYUP:
+            if event.key == pygame.K_LEFT and self.das_direction == 'left':
+                self.das_direction = None
+                self.key_pressed = False
+            elif event.key == pygame.K_RIGHT and self.das_direction == 'right':
+                self.das_direction = None
+                self.key_pressed = False
+            elif event.key == pygame.K_DOWN and self.das_direction == 'down':
+                self.das_direction = None
+                self.key_pressed = False
+        return True
+    
+    def run(self, headless=False, max_ticks=None):
+        """Main game loop
+        
+        Logic runs in fixed ticks (see FixedTimestep) and the screen is drawn
+        once per frame. headless=True skips drawing and waiting and runs one
+        tick per loop back-to-back until the game ends (or max_ticks).
+        """
+        running = True
+        ticks_run = 0
+        tick_ms = self.timestep.tick_ms
+        self.timestep.reset()
+        profiler = self.profiler
         
+        while running:
+            # Work out how many logic ticks this frame covers
+            if headless:
+                ticks = 1
+            else:
+                ticks = self.timestep.advance(self.clock.tick(self.max_fps))
+            
+            with profiler.phase('frame'):
+                # Handle events (keyboard input)
+                with profiler.phase('events'):
+                    for event in pygame.event.get():
+                        if not self.handle_event(event):
+                            running = False
+                
+                for _ in range(ticks):
+                    self.tick(tick_ms)
+                
+                # Drawing (particles are drawn where they are part way into the next tick)
+                if not headless:
+                    self.particles.lead_time = self.timestep.alpha * tick_ms
+                    if self.dirty_rendering:
+                        self.draw_dirty()
+                    else:
+                        self.draw_frame()
+                        with profiler.phase('flip'):
+                            pygame.display.flip()
+            profiler.end_frame()
+            
+            ticks_run += ticks
+            if max_ticks is not None and ticks_run >= max_ticks:
+                running = False
+            if headless and self.game_over:
+                running = False
+        
+        if self.profile_path:
+            self.profiler.export(self.profile_path)
+        if self.controller is not None:
+            print('AI:', self.controller.search.stats())
+            self.controller.close()
+        if self.recorder is not None:
+            self.recorder.save(self.record_path, self)
+        self.scores.close()  # Waits for the last leaderboard writes
         pygame.quit()
 
 
+def seed_type(text):
+    """argparse type for --seed: replays and the particle generator need a non-negative int"""
+    seed = int(text)
+    if seed < 0:
+        raise argparse.ArgumentTypeError('seed must be 0 or more, got {}'.format(seed))
+    return seed
+
+
 # Main entry point
 if __name__ == '__main__':
-    game = TetrisGame()
-    game.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Classic Tetris')
+    parser.add_argument('--seed', type=seed_type, default=None, help='seed for the piece order')
+    parser.add_argument('--srs', action='store_true', help='use the SRS wall kick tables')
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='only redraw the parts of the screen that changed (saves CPU)')
+    parser.add_argument('--max-particles', type=int, default=MAX_PARTICLES,
+                        help='most particle effects alive at once')
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE, help='game logic ticks per second')
+    parser.add_argument('--fps', type=int, default=MAX_FPS, help='most frames drawn per second (0 = no limit)')
+    parser.add_argument('--headless', action='store_true',
+                        help='run the logic as fast as possible without drawing (until game over)')
+    parser.add_argument('--ticks', type=int, default=None, help='stop after this many logic ticks')
+    parser.add_argument('--profile', metavar='PATH', default=None,
+                        help='time each frame phase and write the stats to PATH (.csv or .json) at exit')
+    parser.add_argument('--ai', action='store_true', help='let the beam search bot play')
+    parser.add_argument('--ai-workers', type=int, default=None, help='bot search processes (1 = no pool)')
+    parser.add_argument('--ai-preview', type=int, default=0, help='known pieces the bot looks at after next')
+    parser.add_argument('--preview', type=int, default=PREVIEW_COUNT,
+                        help='upcoming pieces shown in the sidebar')
+    parser.add_argument('--player', default='Player', help='name shown on the leaderboard')
+    parser.add_argument('--record', metavar='PATH', default=None,
+                        help='save a replay of the game (check it with tetris_replay.py verify)')
+    args = parser.parse_args()
+    
+    if args.headless:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    controller = None
+    if args.ai:
+        # Only loaded when asked for, so the game runs without the bot's files
+        from tetris_ai import AIController, BeamSearch, CACHE_SIZE
+        from tetris_cache import TranspositionCache
+        controller = AIController(BeamSearch(preview=args.ai_preview, workers=args.ai_workers,
+                                             cache=TranspositionCache(CACHE_SIZE)))
+    game = TetrisGame(use_srs_kicks=args.srs, seed=args.seed, dirty_rendering=args.dirty_rects,
+                      max_particles=args.max_particles, record_path=args.record,
+                      player=args.player, tick_rate=args.tick_rate, max_fps=args.fps,
+                      profile_path=args.profile, controller=controller, preview_count=args.preview)
+    game.run(headless=args.headless, max_ticks=args.ticks)
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""Beam search bot that plays through the same actions as a human.
+
+Boards are scored with the usual four heuristics (aggregate height, holes,
+bumpiness and lines cleared). The search places the current piece in every
+reachable spot (tetris_placements.py), keeps the best `beam_width` boards,
+then places the next piece and any further known preview pieces on each of
+them. Expanding a level of the beam is spread over a process pool.
+
+A decision must be made before the piece falls a row, so each search gets
+a time budget (the engine's fall_speed by default, 100 ms from level 10 on)
+and stops going deeper when the next level wouldn't fit.
+
+Usage:
+    python tetris_ai.py --games 5 --beam-width 8 --preview 1 --workers 4
+    python tetris.py --ai
+"""
+import argparse
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from tetris_cache import TranspositionCache
+from tetris_engine import GRID_WIDTH, GRID_HEIGHT, ACTION_HARD_DROP, TetrisEngine
+from tetris_placements import enumerate_placements, engine_placements, placement_cells
+
+# Expanded boards the bot keeps between decisions (roughly 10 KB each)
+CACHE_SIZE = 5000
+
+# Weights of the classic hand-tuned evaluation
+WEIGHTS = {
+    'aggregate_height': -0.510066,
+    'lines': 0.760666,
+    'holes': -0.35663,
+    'bumpiness': -0.184483,
+}
+
+
+def board_features(rows):
+    """Returns (aggregate height, holes, bumpiness) of a board given as row bitmasks"""
+    heights = [0] * GRID_WIDTH
+    covered = 0
+    holes = 0
+    for y, row in enumerate(rows):
+        # Columns whose first block is in this row get their height here
+        new = row & ~covered
+        while new:
+            bit = new & -new
+            heights[bit.bit_length() - 1] = GRID_HEIGHT - y
+            new ^= bit
+        holes += bin(covered & ~row).count('1')
+        covered |= row
+    bumpiness = sum(abs(heights[x] - heights[x + 1]) for x in range(GRID_WIDTH - 1))
+    return sum(heights), holes, bumpiness
+
+
+def evaluate(rows, weights=WEIGHTS):
+    """Heuristic value of a board (higher is better), not counting cleared lines"""
+    aggregate_height, holes, bumpiness = board_features(rows)
+    return (weights['aggregate_height'] * aggregate_height + weights['holes'] * holes +
+            weights['bumpiness'] * bumpiness)
+
+
+def expand(rows, shape_name, use_srs_kicks=False, weights=WEIGHTS):
+    """Every placement of a freshly spawned piece as (rows, line reward, board value)
+
+    Runs in the worker processes, so it only takes and returns plain tuples.
+    """
+    return [(placement.rows, weights['lines'] * placement.lines_cleared, evaluate(placement.rows, weights))
+            for placement in enumerate_placements(rows, shape_name, use_srs_kicks=use_srs_kicks)]
+
+
+class BeamSearch:
+    """Chooses placements by searching the current, next and preview pieces
+
+    preview is how many pieces after next_piece_name to look at (the piece
+    bag can always show the next two bags). workers=1 searches in this
+    process; otherwise levels are expanded on a process pool. An optional
+    TranspositionCache keeps expanded boards, so boards reached again (in
+    the same level or in the next decision) are not sent to the workers.
+    """
+
+    def __init__(self, beam_width=8, preview=0, workers=None, weights=WEIGHTS, cache=None):
+        self.beam_width = beam_width
+        self.preview = preview
+        self.weights = weights
+        self.cache = cache
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+
+        # Decision timing
+        self.decisions = 0
+        self.total_time = 0.0
+        self.recent_times = deque(maxlen=1000)
+        self.over_budget = 0
+
+    def close(self):
+        """Shuts the worker pool down"""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def _expand_level(self, beam, shape_name, use_srs_kicks):
+        """Expands every beam entry with one more piece (in parallel when there is a pool)"""
+        jobs = [(entry[2], shape_name, use_srs_kicks, self.weights) for entry in beam]
+        cache = self.cache
+        if cache is None:
+            return self._run(jobs)
+
+        # Expansions only depend on the board and the piece placed on it
+        keys = [(cache.make_key(entry[2], shape_name), use_srs_kicks) for entry in beam]
+        results = [cache.get(key) for key in keys]
+        missing = [index for index, expanded in enumerate(results) if expanded is None]
+        if missing:
+            for index, expanded in zip(missing, self._run([jobs[index] for index in missing])):
+                cache.put(keys[index], expanded)
+                results[index] = expanded
+        return results
+
+    def _run(self, jobs):
+        """Runs expand jobs here or on the pool, keeping their order"""
+        if self.executor is None:
+            return [expand(*job) for job in jobs]
+        return list(self.executor.map(expand, *zip(*jobs)))
+
+    def decide(self, engine, budget_ms=None):
+        """Returns the best Placement (with its actions) for the current piece, or None if there is none"""
+        start = time.perf_counter()
+        budget = (engine.fall_speed if budget_ms is None else budget_ms) / 1000
+
+        placements = engine_placements(engine, with_paths=True)
+        if not placements:
+            return None
+
+        # Beam entries: (value, line reward so far, rows, index of the first placement)
+        weights = self.weights
+        beam = []
+        for index, placement in enumerate(placements):
+            reward = weights['lines'] * placement.lines_cleared
+            beam.append((reward + evaluate(placement.rows, weights), reward, placement.rows, index))
+        beam.sort(key=lambda entry: entry[0], reverse=True)
+        beam = beam[:self.beam_width]
+
+        upcoming = engine.upcoming_pieces(1 + self.preview)
+        level_time = 0.0
+        for shape_name in upcoming:
+            # Stop going deeper if another level probably won't fit in the budget
+            level_start = time.perf_counter()
+            if level_start - start + level_time > budget:
+                break
+            children = []
+            for parent, expanded in zip(beam, self._expand_level(beam, shape_name, engine.use_srs_kicks)):
+                for rows, line_reward, value in expanded:
+                    reward = parent[1] + line_reward
+                    children.append((reward + value, reward, rows, parent[3]))
+            if not children:
+                break  # Every line tops out; judge by what we have
+            children.sort(key=lambda entry: entry[0], reverse=True)
+            beam = children[:self.beam_width]
+            level_time = time.perf_counter() - level_start
+
+        elapsed = time.perf_counter() - start
+        self.decisions += 1
+        self.total_time += elapsed
+        self.recent_times.append(elapsed)
+        if elapsed > budget:
+            self.over_budget += 1
+        return placements[beam[0][3]]
+
+    def stats(self):
+        """Decision rate and timing (ms) as a dict"""
+        ordered = sorted(self.recent_times)
+        stats = {
+            'decisions': self.decisions,
+            'decisions_per_second': self.decisions / self.total_time if self.total_time else 0.0,
+            'mean_ms': 1000 * self.total_time / self.decisions if self.decisions else 0.0,
+            'p99_ms': 1000 * ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] if ordered else 0.0,
+            'max_ms': 1000 * ordered[-1] if ordered else 0.0,
+            'over_budget': self.over_budget,
+        }
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        return stats
+
+
+class AIController:
+    """Plays a game by feeding it actions, in place of the keyboard
+
+    Call update(game) once per logic tick: it plans a path for each new
+    piece and then sends actions_per_tick of its actions. Gravity keeps
+    running between ticks, so when the piece isn't where the path expects
+    the path to the same spot is searched again from where the piece is
+    now (or a new spot is chosen if it can't be reached any more). Once the
+    piece rests on something, the next gravity step would lock it, so the
+    rest of the path (a tuck or spin) is sent in the same tick.
+    """
+
+    def __init__(self, search, actions_per_tick=1):
+        self.search = search
+        self.actions_per_tick = actions_per_tick
+        self.plan = []
+        self.planned_piece = None  # pieces_placed when the plan was made
+        self.target = None  # Cells the chosen placement fills
+        self.expected = None  # (x, y, rotation_state) the rest of the plan starts from
+
+    def choose(self, engine):
+        """Picks a placement for the current piece and plans its path"""
+        placement = self.search.decide(engine)
+        if placement is None:
+            self.target = None
+            self.plan = [ACTION_HARD_DROP]
+        else:
+            self.target = placement_cells(engine.current_piece.shape_name, placement)
+            self.plan = list(placement.actions)
+
+    def replan(self, engine):
+        """Finds a new path to the chosen cells from the piece's current position"""
+        shape_name = engine.current_piece.shape_name
+        if self.target is not None:
+            for placement in engine_placements(engine, with_paths=True):
+                if placement_cells(shape_name, placement) == self.target:
+                    self.plan = list(placement.actions)
+                    return
+        self.choose(engine)  # The spot is out of reach now; pick another one
+
+    def update(self, engine):
+        """Sends the next actions for the current piece, planning first if it is new"""
+        if engine.game_over:
+            return
+        piece = engine.current_piece
+        if self.planned_piece != engine.pieces_placed or not self.plan:
+            self.choose(engine)
+            self.planned_piece = engine.pieces_placed
+        elif self.expected != (piece.x, piece.y, piece.rotation_state):
+            self.replan(engine)  # Gravity moved the piece since our last action
+        sent = 0
+        while self.plan and (sent < self.actions_per_tick or
+                             engine.check_collision(engine.current_piece, 0, 1)):
+            engine.step(self.plan.pop(0))
+            sent += 1
+        piece = engine.current_piece
+        self.expected = (piece.x, piece.y, piece.rotation_state)
+
+    def close(self):
+        self.search.close()
+
+
+def play_game(seed, search, max_pieces=500, use_srs_kicks=False):
+    """Plays one headless game with the search, placing each piece instantly"""
+    engine = TetrisEngine(use_srs_kicks=use_srs_kicks, seed=seed)
+    controller = AIController(search, actions_per_tick=GRID_HEIGHT * GRID_WIDTH)
+    while not engine.game_over and engine.pieces_placed < max_pieces:
+        controller.update(engine)
+    return {'seed': seed, 'score': engine.score, 'lines': engine.lines_cleared,
+            'level': engine.level, 'pieces': engine.pieces_placed, 'game_over': engine.game_over}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Let the beam search bot play headless games')
+    parser.add_argument('--games', type=int, default=3, help='number of games to play')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--max-pieces', type=int, default=500, help='piece limit per game')
+    parser.add_argument('--beam-width', type=int, default=8, help='boards kept per level')
+    parser.add_argument('--preview', type=int, default=0, help='known pieces to search after the next one')
+    parser.add_argument('--workers', type=int, default=None, help='search processes (1 = no pool)')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE,
+                        help='expanded boards kept in a transposition cache (0 = no cache)')
+    parser.add_argument('--srs', action='store_true', help='use the SRS wall kick tables')
+    args = parser.parse_args()
+
+    cache = TranspositionCache(args.cache_size) if args.cache_size > 0 else None
+    search = BeamSearch(args.beam_width, args.preview, args.workers, cache=cache)
+    try:
+        results = [play_game(seed, search, args.max_pieces, args.srs)
+                   for seed in range(args.seed, args.seed + args.games)]
+    finally:
+        search.close()
+    # Level 10 and up drops a row every 100 ms, which is the budget for one decision
+    print(json.dumps({'results': results, 'search': search.stats(), 'budget_ms': 100}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Batched Tetris engine: steps N independent games in lockstep with NumPy.
+
+The rules are the same as TetrisEngine (movement, rotation with centering
+and kicks, hard drop bonus, line clear scoring, levels and the 7-bag), but
+every game's state lives in arrays so one call advances all of them.
+"""
+import numpy as np
+
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT, SHAPE_NAMES, SHAPE_IDS, ROTATION_TABLE, LINE_CLEAR_POINTS,
+    ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP, ACTION_ROTATE, ACTION_HARD_DROP,
+    PieceBag,
+)
+
+
+def _build_tables():
+    """Packs ROTATION_TABLE into arrays indexed by [shape_id, rotation_state]"""
+    cells = np.zeros((len(SHAPE_NAMES), 4, 4, 2), dtype=np.int32)
+    center_offsets = np.zeros((len(SHAPE_NAMES), 4, 2), dtype=np.int32)
+    next_states = np.zeros((len(SHAPE_NAMES), 4), dtype=np.int32)
+    kick_length = max(len(rotation.srs_kicks) for rotations in ROTATION_TABLE.values()
+                      for rotation in rotations)
+    kicks = np.zeros((2, len(SHAPE_NAMES), 4, kick_length, 2), dtype=np.int32)
+
+    for shape_id, name in enumerate(SHAPE_NAMES):
+        for state, rotation in enumerate(ROTATION_TABLE[name]):
+            cells[shape_id, state] = rotation.cells
+            center_offsets[shape_id, state] = rotation.center_offset
+            next_states[shape_id, state] = rotation.next_state
+            for table_index, kick_list in enumerate((rotation.kicks, rotation.srs_kicks)):
+                # Pad short kick lists by repeating the last kick (a repeated test is harmless)
+                padded = list(kick_list) + [kick_list[-1]] * (kick_length - len(kick_list))
+                kicks[table_index, shape_id, state] = padded
+    return cells, center_offsets, next_states, kicks
+
+
+CELLS, CENTER_OFFSETS, NEXT_STATES, KICKS = _build_tables()
+POINTS = np.array(LINE_CLEAR_POINTS, dtype=np.int64)
+O_PIECE_ID = SHAPE_IDS['O']
+
+
+class BatchTetrisEngine:
+    """Runs N games at once; all per-game state is stored in NumPy arrays
+
+    boards has shape (N, GRID_HEIGHT, GRID_WIDTH). The per-game piece state
+    (shape, x, y, rotation_state) and score, lines_cleared, level, fall_speed
+    and game_over are arrays of length N.
+    """
+
+    def __init__(self, num_games, use_srs_kicks=False, seeds=None):
+        self.num_games = num_games
+        self.use_srs_kicks = use_srs_kicks
+        # One seeded bag per game; seeds[i] gives the same pieces as TetrisEngine(seed=seeds[i])
+        if seeds is None:
+            seeds = [None] * num_games
+        self.bags = [PieceBag(seed) for seed in seeds]
+
+        self.boards = np.zeros((num_games, GRID_HEIGHT, GRID_WIDTH), dtype=np.int8)
+        self.shape = np.zeros(num_games, dtype=np.int32)
+        self.next_shape = np.zeros(num_games, dtype=np.int32)
+        self.x = np.zeros(num_games, dtype=np.int32)
+        self.y = np.zeros(num_games, dtype=np.int32)
+        self.rotation_state = np.zeros(num_games, dtype=np.int32)
+        self.score = np.zeros(num_games, dtype=np.int64)
+        self.lines_cleared = np.zeros(num_games, dtype=np.int64)
+        self.level = np.ones(num_games, dtype=np.int64)
+        self.fall_speed = np.full(num_games, 500, dtype=np.int64)
+        self.game_over = np.zeros(num_games, dtype=bool)
+
+        # Prepare the next piece of every game, then spawn the first one
+        all_games = np.arange(num_games)
+        self.next_shape[:] = [SHAPE_IDS[bag.get_next_piece()] for bag in self.bags]
+        self._spawn(all_games)
+
+    def _collides(self, games, shape, rotation_state, x, y):
+        """Checks, for each listed game, if a piece placement hits a wall, the floor or a block"""
+        cells = CELLS[shape, rotation_state]  # (n, 4, 2)
+        cell_x = x[:, None] + cells[..., 0]
+        cell_y = y[:, None] + cells[..., 1]
+
+        outside = (cell_x < 0) | (cell_x >= GRID_WIDTH) | (cell_y >= GRID_HEIGHT)
+        # Cells above the grid are always free; clip indices so the lookup stays in range
+        on_grid = (cell_y >= 0) & ~outside
+        occupied = self.boards[games[:, None],
+                               np.clip(cell_y, 0, GRID_HEIGHT - 1),
+                               np.clip(cell_x, 0, GRID_WIDTH - 1)] != 0
+        return (outside | (on_grid & occupied)).any(axis=1)
+
+    def _move(self, games, dx, dy):
+        """Moves the listed games' pieces where the move is free; returns the success mask"""
+        free = ~self._collides(games, self.shape[games], self.rotation_state[games],
+                               self.x[games] + dx, self.y[games] + dy)
+        moved = games[free]
+        self.x[moved] += dx
+        self.y[moved] += dy
+        return free
+
+    def _rotate(self, games):
+        """Rotates the listed games' pieces clockwise using centering and the kick table"""
+        games = games[self.shape[games] != O_PIECE_ID]  # O piece doesn't rotate
+        shape = self.shape[games]
+        state = self.rotation_state[games]
+        new_state = NEXT_STATES[shape, state]
+        offsets = CENTER_OFFSETS[shape, state]
+        base_x = self.x[games] + offsets[:, 0]
+        base_y = self.y[games] + offsets[:, 1]
+        kicks = KICKS[1 if self.use_srs_kicks else 0, shape, state]  # (n, k, 2)
+
+        # Try each kick in order; the first one that fits wins for that game
+        pending = np.ones(len(games), dtype=bool)
+        for kick in range(kicks.shape[1]):
+            kick_x = base_x + kicks[:, kick, 0]
+            kick_y = base_y + kicks[:, kick, 1]
+            fits = pending & ~self._collides(games, shape, new_state, kick_x, kick_y)
+            done = games[fits]
+            self.x[done] = kick_x[fits]
+            self.y[done] = kick_y[fits]
+            self.rotation_state[done] = new_state[fits]
+            pending &= ~fits
+
+    def _hard_drop(self, games):
+        """Drops the listed games' pieces to the bottom (1 point per row) and locks them"""
+        falling = games
+        while len(falling):
+            moved = self._move(falling, 0, 1)
+            self.score[falling[moved]] += 1  # Small bonus for hard dropping
+            falling = falling[moved]
+        return self._lock(games)
+
+    def _lock(self, games):
+        """Locks pieces, clears lines, scores and spawns; returns lines cleared per game"""
+        cells = CELLS[self.shape[games], self.rotation_state[games]]
+        cell_x = self.x[games][:, None] + cells[..., 0]
+        cell_y = self.y[games][:, None] + cells[..., 1]
+        owner = np.broadcast_to(games[:, None], cell_x.shape)
+        # Board cells hold shape id + 1 (0 means empty)
+        values = np.broadcast_to((self.shape[games] + 1)[:, None], cell_x.shape)
+        visible = cell_y >= 0
+        self.boards[owner[visible], cell_y[visible], cell_x[visible]] = values[visible]
+
+        cleared = self._clear_lines(games)
+        self._spawn(games)
+        return cleared
+
+    def _clear_lines(self, games):
+        """Removes completed rows of the listed games and updates score and level"""
+        boards = self.boards[games]
+        full = (boards != 0).all(axis=2)  # (n, GRID_HEIGHT)
+        counts = full.sum(axis=1)
+
+        cleared_games = np.flatnonzero(counts)
+        if len(cleared_games):
+            # Every surviving row drops by the number of full rows below it
+            full_below = np.cumsum(full[:, ::-1], axis=1)[:, ::-1] - full
+            game_index, row = np.nonzero(~full[cleared_games])
+            target_row = row + full_below[cleared_games][game_index, row]
+            compacted = np.zeros((len(cleared_games), GRID_HEIGHT, GRID_WIDTH), dtype=boards.dtype)
+            compacted[game_index, target_row] = boards[cleared_games][game_index, row]
+            self.boards[games[cleared_games]] = compacted
+
+            # Classic scoring uses the level from before the clear
+            scored = games[cleared_games]
+            self.score[scored] += POINTS[counts[cleared_games]] * self.level[scored]
+            self.lines_cleared[scored] += counts[cleared_games]
+            self.level[scored] = self.lines_cleared[scored] // 10 + 1
+            self.fall_speed[scored] = np.maximum(100, 500 - (self.level[scored] - 1) * 50)
+        return counts
+
+    def _spawn(self, games):
+        """Starts the next piece of each listed game at the top center"""
+        self.shape[games] = self.next_shape[games]
+        self.next_shape[games] = [SHAPE_IDS[self.bags[game].get_next_piece()] for game in games]
+        self.x[games] = GRID_WIDTH // 2 - 1
+        self.y[games] = 0
+        self.rotation_state[games] = 0
+
+        # Check if the new piece immediately collides (game over condition)
+        blocked = self._collides(games, self.shape[games], self.rotation_state[games],
+                                 self.x[games], self.y[games])
+        self.game_over[games[blocked]] = True
+
+    def step(self, actions):
+        """Applies one action per game and returns the lines each game cleared"""
+        actions = np.asarray(actions)
+        cleared = np.zeros(self.num_games, dtype=np.int64)
+        playing = ~self.game_over
+
+        self._move(np.flatnonzero(playing & (actions == ACTION_LEFT)), -1, 0)
+        self._move(np.flatnonzero(playing & (actions == ACTION_RIGHT)), 1, 0)
+
+        soft_drop = np.flatnonzero(playing & (actions == ACTION_SOFT_DROP))
+        moved = self._move(soft_drop, 0, 1)
+        self.score[soft_drop[moved]] += 1  # Small bonus for soft drop
+
+        self._rotate(np.flatnonzero(playing & (actions == ACTION_ROTATE)))
+
+        hard_drop = np.flatnonzero(playing & (actions == ACTION_HARD_DROP))
+        if len(hard_drop):
+            cleared[hard_drop] = self._hard_drop(hard_drop)
+        return cleared
+
+    def apply_gravity(self):
+        """Moves every live piece down one row, locking the ones that can't move"""
+        cleared = np.zeros(self.num_games, dtype=np.int64)
+        playing = np.flatnonzero(~self.game_over)
+        moved = self._move(playing, 0, 1)
+        landed = playing[~moved]
+        if len(landed):
+            cleared[landed] = self._lock(landed)
+        return cleared
+
+    def reset_games(self, games, seeds=None):
+        """Starts fresh games in the listed slots (optionally with new seeds)"""
+        games = np.asarray(games, dtype=np.intp)
+        for index, game in enumerate(games):
+            self.bags[game] = PieceBag(seeds[index] if seeds is not None else None)
+        self.boards[games] = 0
+        self.score[games] = 0
+        self.lines_cleared[games] = 0
+        self.level[games] = 1
+        self.fall_speed[games] = 500
+        self.game_over[games] = False
+        self.next_shape[games] = [SHAPE_IDS[self.bags[game].get_next_piece()] for game in games]
+        self._spawn(games)
@@ -0,0 +1,228 @@
+"""Throughput benchmarks for the engine hot paths and the renderer.
+
+Every case runs on fixed board fixtures (empty, half-filled, near top-out)
+built from a fixed seed, so numbers from different commits are comparable.
+Engine cases time each call individually (setup between calls isn't
+counted). The draw case renders frames offscreen with SDL's dummy video
+driver. Results are printed (or written) as JSON.
+
+Usage:
+    python tetris_bench.py --output bench.json
+    python tetris_bench.py --cases collision ghost --fixtures empty --scale 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT, SHAPES, SHAPE_COLORS,
+    Board, Tetromino, TetrisEngine,
+)
+
+FIXTURE_SEED = 12345
+FIXTURES = ('empty', 'half', 'near_topout')
+
+
+def build_fixture(name, seed=FIXTURE_SEED):
+    """Returns a Board filled according to the fixture name (same board for the same seed)"""
+    rng = random.Random(seed)
+    board = Board()
+    if name == 'empty':
+        return board
+    first_row = GRID_HEIGHT // 2 if name == 'half' else 4  # near_topout leaves the spawn rows free
+    colors = list(SHAPE_COLORS.values())
+    for y in range(first_row, GRID_HEIGHT):
+        # Every row has one to three holes, so nothing is complete yet
+        holes = set(rng.sample(range(GRID_WIDTH), rng.randint(1, 3)))
+        board.place([(x, y) for x in range(GRID_WIDTH) if x not in holes], rng.choice(colors))
+    return board
+
+
+def fixture_engine(fixture, seed=FIXTURE_SEED):
+    """A seeded engine sitting on a fresh copy of the fixture board"""
+    engine = TetrisEngine(seed=seed)
+    engine.board = fixture.copy()
+    return engine
+
+
+def sample_pieces(engine, count, seed=FIXTURE_SEED):
+    """Pieces with random shape, rotation and column, placed where they don't collide"""
+    rng = random.Random(seed)
+    names = list(SHAPES.keys())
+    pieces = []
+    while len(pieces) < count:
+        piece = Tetromino(rng.choice(names))
+        for _ in range(rng.randrange(4)):
+            piece.rotate()
+        piece.x = rng.randrange(-1, GRID_WIDTH - 1)
+        if not engine.check_collision(piece):
+            pieces.append(piece)
+    return pieces
+
+
+def result(case, fixture, iterations, seconds, unit):
+    """One benchmark result as a JSON-ready dict"""
+    return {
+        'case': case,
+        'fixture': fixture,
+        'iterations': iterations,
+        'seconds': seconds,
+        'per_second': iterations / seconds if seconds else 0.0,
+        'unit': unit,
+    }
+
+
+def bench_lock(fixture_name, fixture, iterations):
+    """Pieces locked per second through lock_piece (which runs clear_lines)"""
+    engine = fixture_engine(fixture)
+    # Rest every sample piece on the fixture first; locking them is what gets timed
+    resting = []
+    for piece in sample_pieces(engine, 64):
+        engine.current_piece = piece
+        resting.append(engine.get_ghost_piece())
+    elapsed = 0.0
+    for index in range(iterations):
+        engine.board = fixture.copy()
+        engine.game_over = False
+        engine.current_piece = resting[index % len(resting)].copy()
+        start = time.perf_counter()
+        engine.lock_piece()
+        elapsed += time.perf_counter() - start
+    return result('lock_piece', fixture_name, iterations, elapsed, 'pieces')
+
+
+def bench_collision(fixture_name, fixture, iterations):
+    """check_collision calls per second (one row below each sample piece)"""
+    engine = fixture_engine(fixture)
+    pieces = sample_pieces(engine, 256)
+    check_collision = engine.check_collision
+    count = len(pieces)
+    start = time.perf_counter()
+    for index in range(iterations):
+        check_collision(pieces[index % count], 0, 1)
+    return result('check_collision', fixture_name, iterations, time.perf_counter() - start, 'calls')
+
+
+def bench_rotate(fixture_name, fixture, iterations):
+    """Rotation attempts per second through rotate_piece (kicks included)"""
+    engine = fixture_engine(fixture)
+    pieces = sample_pieces(engine, 256)
+    elapsed = 0.0
+    for index in range(iterations):
+        engine.current_piece = pieces[index % len(pieces)].copy()
+        start = time.perf_counter()
+        engine.rotate_piece()
+        elapsed += time.perf_counter() - start
+    return result('rotate_piece', fixture_name, iterations, elapsed, 'rotations')
+
+
+def bench_ghost(fixture_name, fixture, iterations):
+    """Ghost positions computed per second through get_ghost_piece"""
+    engine = fixture_engine(fixture)
+    pieces = sample_pieces(engine, 256)
+    count = len(pieces)
+    start = time.perf_counter()
+    for index in range(iterations):
+        engine.current_piece = pieces[index % count]
+        engine.get_ghost_piece()
+    return result('get_ghost_piece', fixture_name, iterations, time.perf_counter() - start, 'ghosts')
+
+
+def bench_snapshot(fixture_name, fixture, iterations):
+    """Snapshot + restore round trips per second, with a different piece on the board each time"""
+    engine = fixture_engine(fixture)
+    resting = []
+    for piece in sample_pieces(engine, 64):
+        engine.current_piece = piece
+        resting.append(engine.get_ghost_piece())
+    start_state = engine.snapshot()
+    elapsed = 0.0
+    for index in range(iterations):
+        # Change one row so the board snapshot can't simply be reused
+        engine.board.place(resting[index % len(resting)].get_blocks(), SHAPE_COLORS['T'])
+        start = time.perf_counter()
+        engine.snapshot()
+        engine.restore(start_state)
+        elapsed += time.perf_counter() - start
+    return result('snapshot', fixture_name, iterations, elapsed, 'round trips')
+
+
+def bench_draw(fixture_name, fixture, iterations):
+    """Full frames per second through draw_frame, rendered offscreen"""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # Keep stdout pure JSON
+    import tetris  # Only this case needs pygame
+
+    # Keep the game's leaderboard file out of the working directory
+    temp_dir = tempfile.mkdtemp()
+    try:
+        game = tetris.TetrisGame(seed=FIXTURE_SEED, high_score_db=os.path.join(temp_dir, 'scores.db'))
+        game.board = fixture.copy()
+        game.current_piece = sample_pieces(game, 1)[0]
+        # A line clear worth of particles, so their drawing is part of the frame
+        for y in range(GRID_HEIGHT - 4, GRID_HEIGHT):
+            game.particles.add_line_clear_particles(y, GRID_WIDTH, tetris.BLOCK_SIZE,
+                                                    tetris.GAME_AREA_X, tetris.GAME_AREA_Y)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            game.draw_frame()
+            tetris.pygame.display.flip()
+        elapsed = time.perf_counter() - start
+        game.scores.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return result('draw_frame', fixture_name, iterations, elapsed, 'frames')
+
+
+# name: (function, default iterations)
+CASES = {
+    'lock': (bench_lock, 20000),
+    'collision': (bench_collision, 200000),
+    'rotate': (bench_rotate, 50000),
+    'ghost': (bench_ghost, 50000),
+    'snapshot': (bench_snapshot, 50000),
+    'draw': (bench_draw, 500),
+}
+
+
+def run_benchmarks(cases=None, fixtures=FIXTURES, scale=1.0):
+    """Runs the chosen cases on every fixture and returns the results as a dict"""
+    results = []
+    for case in cases or CASES:
+        function, iterations = CASES[case]
+        for fixture_name in fixtures:
+            fixture = build_fixture(fixture_name)
+            results.append(function(fixture_name, fixture, max(1, int(iterations * scale))))
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'fixture_seed': FIXTURE_SEED,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Tetris engine and renderer')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), help='cases to run (default: all)')
+    parser.add_argument('--fixtures', nargs='+', choices=FIXTURES, default=list(FIXTURES))
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies every iteration count')
+    parser.add_argument('--output', help='write the JSON here instead of printing it')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.cases, args.fixtures, args.scale)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Bounded LRU transposition cache for board evaluations.
+
+Boards are keyed by a packed fingerprint of their row bitmasks (exact, so two
+different boards never share a key) together with the name of the piece
+placed on them. The bot's BeamSearch (tetris_ai.py) keeps one so boards it
+reaches again aren't expanded twice, and enumerate_placements
+(tetris_placements.py) can take one too. The engine's lock path doesn't use
+it: finding full rows only compares the few rows a piece touched, which is
+cheaper than building a key.
+"""
+from collections import OrderedDict
+
+from tetris_engine import GRID_WIDTH
+
+
+def board_fingerprint(rows):
+    """Packs all row bitmasks into one int (top row in the highest bits)"""
+    fingerprint = 0
+    for row in rows:
+        fingerprint = (fingerprint << GRID_WIDTH) | row
+    return fingerprint
+
+
+def state_key(rows, piece_name):
+    """Hashable key for a board plus the name of the piece placed on it"""
+    return (board_fingerprint(rows), piece_name)
+
+
+class TranspositionCache:
+    """Maps state keys to computed results, evicting the least recently used"""
+
+    # Builds keys from (rows, piece name)
+    make_key = staticmethod(state_key)
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """Returns the cached value for key (marking it recently used) or default"""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Stores a value, evicting the oldest entry when the cache is full"""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every entry and resets the counters"""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        """Fraction of lookups that were found in the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """Returns size and hit/miss counters as a dict"""
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+        }
@@ -0,0 +1,221 @@
+"""Replay corpus: an append-only blob of recorded games plus a fixed-width index.
+
+corpus.trc holds the replays (tetris_replay.py format) back to back, and
+corpus.trc.idx holds one fixed-size record per replay with its offset and the
+final stats of its last game. The index is memory-mapped as a NumPy record
+array, so queries like "top scores" or "games that reached level 15" scan
+millions of games without touching the blob, and a single game is decoded
+straight out of the mapped blob without copying it.
+
+There should be only one writer at a time. The blob is written before the
+index record, so an interrupted add leaves at most some unused blob bytes.
+
+Usage:
+    python tetris_corpus.py add corpus.trc game1.trpl game2.trpl ...
+    python tetris_corpus.py top corpus.trc --count 10
+    python tetris_corpus.py query corpus.trc --min-level 15 --min-tetris-rate 0.5
+"""
+import argparse
+import mmap
+import os
+
+import numpy as np
+
+from tetris_engine import TetrisEngine
+from tetris_replay import ReplayError, play_replay
+
+# One index record per game (little-endian so corpora can be copied between machines)
+INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),   # Start of the replay in the blob
+    ('length', '<u4'),   # Size of the replay in bytes
+    # A replay can restart, so the seed and stats below are all its last game's
+    # (playback still starts from the seed in the replay header)
+    ('seed', '<u8'),
+    ('score', '<u4'),
+    ('lines', '<u4'),
+    ('level', '<u4'),
+    ('pieces', '<u4'),
+    ('tetrises', '<u4'),  # Four-line clears, for the Tetris rate
+])
+
+
+class TetrisCountingEngine(TetrisEngine):
+    """Engine that counts four-line clears while a replay is played back"""
+
+    def __init__(self, *args, **kwargs):
+        self.tetrises = 0
+        super().__init__(*args, **kwargs)
+
+    def on_lines_cleared(self, cleared_rows, leveled_up):
+        if len(cleared_rows) == 4:
+            self.tetrises += 1
+
+    def reset_game(self, seed=None):
+        # Replays that restart only index their last game
+        self.tetrises = 0
+        super().reset_game(seed)
+
+
+class ReplayCorpus:
+    """Appends replays to a corpus and answers queries from its mapped index"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.idx'
+        # Create both files so an empty corpus can be opened and queried
+        for file_path in (self.path, self.index_path):
+            if not os.path.exists(file_path):
+                open(file_path, 'wb').close()
+        self._index = None
+        self._blob = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def index(self):
+        """Record array of every game (memory-mapped, read-only)"""
+        if self._index is None:
+            count = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+            if count:
+                self._index = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode='r', shape=(count,))
+            else:
+                self._index = np.zeros(0, dtype=INDEX_DTYPE)
+        return self._index
+
+    def _mapped_blob(self):
+        """The blob file mapped into memory (reopened after appends)"""
+        if self._blob is None:
+            with open(self.path, 'rb') as blob_file:
+                self._blob = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._blob
+
+    def close(self):
+        """Releases the mappings (they are reopened on the next query)
+
+        A mapping that replay_data() views still point into stays open
+        until the last of those views is released.
+        """
+        self._index = None
+        if self._blob is not None:
+            try:
+                self._blob.close()
+            except BufferError:
+                pass  # Views are still alive; dropping our reference is enough
+            self._blob = None
+
+    def add(self, data):
+        """Checks a replay by playing it, appends it and returns its entry number"""
+        engine, summary, end = play_replay(data, engine_class=TetrisCountingEngine)
+        if not summary.matches(engine):
+            raise ReplayError("replay doesn't reach its recorded final state")
+
+        self.close()
+        with open(self.path, 'ab') as blob:
+            offset = blob.tell()
+            blob.write(data[:end])
+        record = np.array([(offset, end, engine.seed, engine.score, engine.lines_cleared,
+                            engine.level, engine.pieces_placed, engine.tetrises)], dtype=INDEX_DTYPE)
+        with open(self.index_path, 'ab') as index:
+            entry = index.tell() // INDEX_DTYPE.itemsize
+            index.write(record.tobytes())
+        return entry
+
+    def replay_data(self, entry):
+        """Zero-copy view of one stored replay (it keeps its mapping alive; use bytes() for a copy)"""
+        record = self.index[entry]
+        offset = int(record['offset'])
+        return memoryview(self._mapped_blob())[offset:offset + int(record['length'])]
+
+    def play(self, entry, engine_class=TetrisEngine):
+        """Replays one stored game; returns (engine, summary)"""
+        record = self.index[entry]
+        engine, summary, _ = play_replay(self._mapped_blob(), int(record['offset']), engine_class)
+        return engine, summary
+
+    def tetris_rates(self):
+        """Fraction of each game's lines that were cleared four at a time"""
+        index = self.index
+        lines = index['lines'].astype(np.float64)
+        return np.divide(index['tetrises'] * 4.0, lines, out=np.zeros(len(index)), where=lines > 0)
+
+    def top_scores(self, count=10):
+        """Entry numbers of the highest scoring games, best first"""
+        scores = self.index['score']
+        count = min(count, len(scores))
+        if count == 0:
+            return np.zeros(0, dtype=np.intp)
+        best = np.argpartition(scores, len(scores) - count)[len(scores) - count:]
+        return best[np.argsort(scores[best], kind='stable')[::-1]]
+
+    def query(self, min_score=None, min_lines=None, min_level=None, min_tetris_rate=None):
+        """Entry numbers of the games matching every given minimum"""
+        index = self.index
+        keep = np.ones(len(index), dtype=bool)
+        if min_score is not None:
+            keep &= index['score'] >= min_score
+        if min_lines is not None:
+            keep &= index['lines'] >= min_lines
+        if min_level is not None:
+            keep &= index['level'] >= min_level
+        if min_tetris_rate is not None:
+            keep &= self.tetris_rates() >= min_tetris_rate
+        return np.flatnonzero(keep)
+
+
+def print_entries(corpus, entries):
+    """Prints one line per listed game"""
+    rates = corpus.tetris_rates()
+    for entry in entries:
+        record = corpus.index[entry]
+        print('#{:<8} seed {:<10} score {:<8} lines {:<5} level {:<3} pieces {:<6} tetris rate {:.2f}'.format(
+            entry, record['seed'], record['score'], record['lines'], record['level'],
+            record['pieces'], rates[entry]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive and query recorded Tetris games')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = commands.add_parser('add', help='append replay files to a corpus')
+    add_parser.add_argument('corpus')
+    add_parser.add_argument('replays', nargs='+')
+
+    top_parser = commands.add_parser('top', help='list the highest scores')
+    top_parser.add_argument('corpus')
+    top_parser.add_argument('--count', type=int, default=10)
+
+    query_parser = commands.add_parser('query', help='list games matching the given minimums')
+    query_parser.add_argument('corpus')
+    query_parser.add_argument('--min-score', type=int)
+    query_parser.add_argument('--min-lines', type=int)
+    query_parser.add_argument('--min-level', type=int)
+    query_parser.add_argument('--min-tetris-rate', type=float)
+    args = parser.parse_args()
+
+    with ReplayCorpus(args.corpus) as corpus:
+        if args.command == 'add':
+            for path in args.replays:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                try:
+                    print('{}: entry {}'.format(path, corpus.add(data)))
+                except ReplayError as error:
+                    print('{}: skipped ({})'.format(path, error))
+        elif args.command == 'top':
+            print_entries(corpus, corpus.top_scores(args.count))
+        else:
+            entries = corpus.query(args.min_score, args.min_lines, args.min_level,
+                                   args.min_tetris_rate)
+            print_entries(corpus, entries)
+            print('{} of {} games match'.format(len(entries), len(corpus)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,865 @@
+"""Display-free Tetris rules engine.
+
+Everything in here is plain Python: importing this module never touches
+pygame, so the rules can be driven headlessly (bots, simulations) or
+rendered on top by tetris.py.
+"""
+import random
+from collections import deque
+from itertools import islice
+
+# Grid size (in blocks)
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+
+# Colors (RGB format)
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+DARK_GRAY = (50, 50, 50)
+CYAN = (0, 255, 255)
+YELLOW = (255, 255, 0)
+PURPLE = (128, 0, 128)
+GREEN = (0, 255, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+ORANGE = (255, 165, 0)
+
+# Tetromino shapes (the classic 7 pieces)
+# Each shape is a list of coordinates relative to a center point
+SHAPES = {
+    'I': [[0, 0], [0, 1], [0, 2], [0, 3]],      # Line piece
+    'O': [[0, 0], [0, 1], [1, 0], [1, 1]],      # Square piece
+    'T': [[0, 1], [1, 0], [1, 1], [1, 2]],      # T-piece
+    'S': [[0, 1], [0, 2], [1, 0], [1, 1]],      # S-piece
+    'Z': [[0, 0], [0, 1], [1, 1], [1, 2]],      # Z-piece
+    'J': [[0, 0], [1, 0], [1, 1], [1, 2]],      # J-piece
+    'L': [[0, 2], [1, 0], [1, 1], [1, 2]]       # L-piece
+}
+
+# Colors for each shape
+SHAPE_COLORS = {
+    'I': CYAN,
+    'O': YELLOW,
+    'T': PURPLE,
+    'S': GREEN,
+    'Z': RED,
+    'J': BLUE,
+    'L': ORANGE
+}
+
+# Shape ids (index in SHAPES), used wherever a piece is stored as a number
+SHAPE_NAMES = list(SHAPES.keys())
+SHAPE_IDS = {name: shape_id for shape_id, name in enumerate(SHAPE_NAMES)}
+
+# SRS (Super Rotation System) Wall Kick Data
+# Format: rotation_state -> list of (x_offset, y_offset) to try
+# Simplified version - less aggressive kicks for more natural feel
+
+# Wall kicks for J, L, T, S, Z pieces
+WALL_KICK_DATA = {
+    (0, 1): [(0, 0), (-1, 0), (1, 0), (0, -1)],  # 0->R
+    (1, 0): [(0, 0), (1, 0), (-1, 0), (0, 1)],   # R->0
+    (1, 2): [(0, 0), (1, 0), (-1, 0), (0, -1)],  # R->2
+    (2, 1): [(0, 0), (-1, 0), (1, 0), (0, 1)],   # 2->R
+    (2, 3): [(0, 0), (1, 0), (-1, 0), (0, -1)],  # 2->L
+    (3, 2): [(0, 0), (-1, 0), (1, 0), (0, 1)],   # L->2
+    (3, 0): [(0, 0), (-1, 0), (1, 0), (0, 1)],   # L->0
+    (0, 3): [(0, 0), (1, 0), (-1, 0), (0, -1)],  # 0->L
+}
+
+# Wall kicks for I piece (still needs more kicks due to its shape)
+WALL_KICK_DATA_I = {
+    (0, 1): [(0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0)],  # 0->R
+    (1, 0): [(0, 0), (1, 0), (-1, 0), (2, 0), (-2, 0)],  # R->0
+    (1, 2): [(0, 0), (1, 0), (-1, 0), (2, 0), (-2, 0)],  # R->2
+    (2, 1): [(0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0)],  # 2->R
+    (2, 3): [(0, 0), (1, 0), (-1, 0), (2, 0), (-2, 0)],  # 2->L
+    (3, 2): [(0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0)],  # L->2
+    (3, 0): [(0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0)],  # L->0
+    (0, 3): [(0, 0), (1, 0), (-1, 0), (2, 0), (-2, 0)],  # 0->L
+}
+
+# A row with every column filled (bit x is set when column x is occupied)
+FULL_MASK = (1 << GRID_WIDTH) - 1
+
+# Classic Tetris scoring: 1 line=100, 2=300, 3=500, 4=800 (times the level)
+LINE_CLEAR_POINTS = [0, 100, 300, 500, 800]
+
+# Upcoming pieces PieceBag always has ready (two full bags)
+PIECE_QUEUE_SIZE = 14
+
+# Actions understood by TetrisEngine.step()
+ACTION_NONE = 0
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_SOFT_DROP = 3
+ACTION_ROTATE = 4
+ACTION_HARD_DROP = 5
+
+
+# Kicks tried after a rotation when SRS kicks are off: in place, then one
+# column left/right, then one row up
+DEFAULT_KICKS = ((0, 0), (-1, 0), (1, 0), (0, -1))
+
+# Piece positions this far outside the grid still get interned block tuples
+PLACED_MARGIN = 4
+PLACED_COLUMNS = GRID_WIDTH + 2 * PLACED_MARGIN
+PLACED_ROWS = GRID_HEIGHT + 2 * PLACED_MARGIN
+
+
+class PieceRotation:
+    """Precomputed data for one shape in one rotation state"""
+
+    def __init__(self, shape_name, state, cells, next_cells, next_state):
+        self.shape_name = shape_name
+        self.state = state
+        self.cells = cells  # ((x, y), ...) relative to the piece position
+        self.color = SHAPE_COLORS[shape_name]
+        self.next_state = next_state
+
+        # Absolute cells per position, built on first use by blocks_at():
+        # placed[y + PLACED_MARGIN][x + PLACED_MARGIN]
+        self.placed = [None] * PLACED_ROWS
+
+        # Row bitmasks used for collision: (min_x, max_x, ((dy, row_mask), ...)),
+        # with bit 0 being the piece's leftmost column
+        min_x = min(cell[0] for cell in cells)
+        max_x = max(cell[0] for cell in cells)
+        row_masks = {}
+        for cell in cells:
+            row_masks[cell[1]] = row_masks.get(cell[1], 0) | (1 << (cell[0] - min_x))
+        self.masks = (min_x, max_x, tuple(sorted(row_masks.items())))
+
+        # Bottom profile for drops: ((dx, lowest dy in that column), ...)
+        bottoms = {}
+        for cell in cells:
+            bottoms[cell[0]] = max(bottoms.get(cell[0], cell[1]), cell[1])
+        self.bottoms = tuple(sorted(bottoms.items()))
+
+        # Offset that keeps the piece visually centered when rotating clockwise
+        # from this state (difference of the centers of mass, rounded)
+        center_x_before = sum(cell[0] for cell in cells) / len(cells)
+        center_y_before = sum(cell[1] for cell in cells) / len(cells)
+        center_x_after = sum(cell[0] for cell in next_cells) / len(next_cells)
+        center_y_after = sum(cell[1] for cell in next_cells) / len(next_cells)
+        self.center_offset = (round(center_x_before - center_x_after),
+                              round(center_y_before - center_y_after))
+
+        # Kick lists tried (in order) after rotating clockwise from this state
+        self.kicks = DEFAULT_KICKS
+        kick_data = WALL_KICK_DATA_I if shape_name == 'I' else WALL_KICK_DATA
+        self.srs_kicks = tuple(kick_data.get((state, next_state), DEFAULT_KICKS))
+
+    def blocks_at(self, x, y):
+        """The absolute ((x, y), ...) cells with the piece at (x, y), as a shared tuple"""
+        row = y + PLACED_MARGIN
+        column = x + PLACED_MARGIN
+        if 0 <= row < PLACED_ROWS and 0 <= column < PLACED_COLUMNS:
+            placed = self.placed[row]
+            if placed is None:
+                placed = self.placed[row] = [None] * PLACED_COLUMNS
+            blocks = placed[column]
+            if blocks is None:
+                blocks = placed[column] = tuple((x + cell[0], y + cell[1]) for cell in self.cells)
+            return blocks
+        return tuple((x + cell[0], y + cell[1]) for cell in self.cells)
+
+
+def build_rotation_table():
+    """Builds {shape name: [PieceRotation for states 0-3]} from SHAPES"""
+    table = {}
+    for shape_name, spawn_shape in SHAPES.items():
+        # Rotation formula: (x, y) becomes (y, -x); the O piece never rotates
+        all_cells = [tuple((block[0], block[1]) for block in spawn_shape)]
+        for _ in range(3):
+            if shape_name == 'O':
+                all_cells.append(all_cells[-1])
+            else:
+                all_cells.append(tuple((cell[1], -cell[0]) for cell in all_cells[-1]))
+
+        rotations = []
+        for state in range(4):
+            next_state = 0 if shape_name == 'O' else (state + 1) % 4
+            rotations.append(PieceRotation(shape_name, state, all_cells[state],
+                                           all_cells[next_state], next_state))
+        table[shape_name] = rotations
+    return table
+
+
+# Every shape's cells, collision masks, centering offsets and kicks,
+# indexed as ROTATION_TABLE[shape_name][rotation_state]
+ROTATION_TABLE = build_rotation_table()
+
+
+def rows_collide(rows, masks, x, y):
+    """Checks if piece row masks placed at (x, y) hit a wall, the floor or a filled bit in rows"""
+    min_x, max_x, row_masks = masks
+    if x + min_x < 0 or x + max_x >= GRID_WIDTH:
+        return True
+
+    shift = x + min_x
+    for dy, mask in row_masks:
+        row = y + dy
+        if row >= GRID_HEIGHT:
+            return True
+        # Rows above the grid are always free
+        if row >= 0 and rows[row] & (mask << shift):
+            return True
+    return False
+
+
+class Tetromino:
+    """Represents a single Tetris piece
+
+    A piece is just its shape name, position and PieceRotation; the cells
+    (relative and absolute) are tuples from ROTATION_TABLE shared by every
+    piece in the same rotation, so moving, copying and reading blocks
+    doesn't build any lists.
+    """
+
+    __slots__ = ('shape_name', 'rotation', 'x', 'y')
+
+    def __init__(self, shape_name, x=GRID_WIDTH // 2 - 1, y=0, rotation_state=0):
+        self.shape_name = shape_name
+        # Rotation state 0=spawn, 1=right, 2=180, 3=left (used for SRS wall kicks)
+        self.rotation = ROTATION_TABLE[shape_name][rotation_state]
+        # Start at the top center of the grid
+        self.x = x
+        self.y = y
+
+    @property
+    def rotation_state(self):
+        return self.rotation.state
+
+    @rotation_state.setter
+    def rotation_state(self, state):
+        self.rotation = ROTATION_TABLE[self.shape_name][state]
+
+    @property
+    def shape(self):
+        """Cells relative to the piece position (shared, never modified)"""
+        return self.rotation.cells
+
+    @property
+    def color(self):
+        return self.rotation.color
+
+    def get_blocks(self):
+        """Returns the absolute (x, y) grid positions of all blocks (a shared tuple; don't modify it)"""
+        return self.rotation.blocks_at(self.x, self.y)
+
+    def rotate(self):
+        """Rotates the piece 90 degrees clockwise"""
+        # The square piece's next state is always 0, so it never turns
+        self.rotation = ROTATION_TABLE[self.shape_name][self.rotation.next_state]
+
+    def copy(self):
+        """Creates a copy of this tetromino"""
+        new_piece = Tetromino.__new__(Tetromino)
+        new_piece.shape_name = self.shape_name
+        new_piece.rotation = self.rotation
+        new_piece.x = self.x
+        new_piece.y = self.y
+        return new_piece
+
+
+class PieceBag:
+    """Implements the 7-bag random system for fair piece distribution
+
+    Upcoming pieces wait in a deque that is topped up a whole bag at a time
+    so it always holds at least queue_size of them. Refilling early doesn't
+    change the order: every bag is still shuffled by the same generator in
+    the same sequence.
+    """
+
+    def __init__(self, seed=None, queue_size=PIECE_QUEUE_SIZE):
+        # Each bag has its own random generator so games can be reproduced
+        self.rng = random.Random(seed)
+        self.rng_state = None  # Cached rng.getstate() for snapshots, until the next shuffle
+        self.queue_size = queue_size
+        self.queue = deque()
+        self.taken = 0  # Pieces handed out so far
+        self.fill(queue_size)
+
+    def refill_bag(self):
+        """Adds all 7 pieces in random order to the end of the queue"""
+        pieces = list(SHAPES.keys())
+        self.rng.shuffle(pieces)
+        self.rng_state = None
+        self.queue.extend(pieces)
+
+    def fill(self, count):
+        """Refills until at least count pieces are waiting"""
+        while len(self.queue) < count:
+            self.refill_bag()
+
+    def get_next_piece(self):
+        """Takes the next piece from the queue"""
+        piece = self.queue.popleft()
+        self.taken += 1
+        if len(self.queue) < self.queue_size:
+            self.refill_bag()
+        return piece
+
+    def skip(self, count):
+        """Takes count pieces without looking at them"""
+        for _ in range(count):
+            self.get_next_piece()
+
+    def get_state(self):
+        """(generator state, queued pieces, pieces taken), all immutable"""
+        if self.rng_state is None:
+            self.rng_state = self.rng.getstate()
+        return (self.rng_state, tuple(self.queue), self.taken)
+
+    def set_state(self, state):
+        """Goes back to a state from get_state()"""
+        self.rng_state, queue, self.taken = state
+        self.rng.setstate(self.rng_state)
+        self.queue = deque(queue)
+
+    def peek(self, count):
+        """Returns the next count pieces without taking them"""
+        self.fill(count)
+        return list(islice(self.queue, count))
+
+
+# Used to blank reused color rows without building a new list
+EMPTY_COLOR_ROW = (None,) * GRID_WIDTH
+
+
+class Board:
+    """The playfield: one integer bitmask per row plus a color plane
+
+    Rules only look at `rows`; `colors` (None or an RGB tuple per cell) is
+    kept in step purely so the renderer knows what to draw. `tops` is the
+    skyline: the row of the highest block in each column (GRID_HEIGHT if the
+    column is empty), kept up to date by place() and remove_rows().
+
+    `frozen_colors` holds an immutable tuple of each color row for
+    snapshots (None once the row has changed), so consecutive snapshots
+    share every row that didn't change in between.
+    """
+
+    def __init__(self):
+        self.rows = [0] * GRID_HEIGHT
+        self.colors = [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
+        self.tops = [GRID_HEIGHT] * GRID_WIDTH
+        self.frozen_colors = [EMPTY_COLOR_ROW] * GRID_HEIGHT
+        # Bumped on every change so renderers can skip unchanged boards
+        self.version = 0
+        self.last_snapshot = None  # Returned again while the version is the same
+
+    def collides(self, masks, x, y):
+        """Checks if piece row masks placed at (x, y) hit a wall, the floor or a block"""
+        return rows_collide(self.rows, masks, x, y)
+
+    def place(self, blocks, color):
+        """Fills the given (x, y) cells, ignoring any above the grid"""
+        for block in blocks:
+            x, y = block[0], block[1]
+            if 0 <= y < GRID_HEIGHT:
+                self.rows[y] |= 1 << x
+                self.colors[y][x] = color
+                self.frozen_colors[y] = None
+                if y < self.tops[x]:
+                    self.tops[x] = y
+        self.version += 1
+
+    def full_rows(self, rows_to_check=None):
+        """Returns the indices of completely filled rows, top to bottom
+
+        rows_to_check (ascending) limits the search, e.g. to the rows a piece
+        was just locked into; by default every row is checked.
+        """
+        rows = self.rows
+        if rows_to_check is None:
+            rows_to_check = range(GRID_HEIGHT)
+        return [y for y in rows_to_check if rows[y] == FULL_MASK]
+
+    def remove_rows(self, rows_to_remove):
+        """Deletes the given rows (in ascending order) and adds empty rows at the top
+
+        Works in place in one pass from the lowest removed row upwards: every
+        kept row moves down once, straight to its final index, and the
+        removed color rows are emptied and reused as the new top rows.
+        """
+        if not rows_to_remove:
+            return
+
+        rows = self.rows
+        colors = self.colors
+        frozen = self.frozen_colors
+        freed = [colors[y] for y in rows_to_remove]
+
+        # Rows below the lowest removed row stay where they are
+        write = rows_to_remove[-1]
+        pending = len(rows_to_remove) - 2  # Next removed row to skip (walking upwards)
+        for read in range(write - 1, -1, -1):
+            if pending >= 0 and read == rows_to_remove[pending]:
+                pending -= 1
+                continue
+            rows[write] = rows[read]
+            colors[write] = colors[read]
+            frozen[write] = frozen[read]
+            write -= 1
+
+        for y, color_row in enumerate(freed):
+            rows[y] = 0
+            color_row[:] = EMPTY_COLOR_ROW
+            colors[y] = color_row
+            frozen[y] = EMPTY_COLOR_ROW
+
+        self.update_tops(rows_to_remove)
+        self.version += 1
+
+    def update_tops(self, removed_rows):
+        """Moves the skyline down after removing rows (given as their old indices)"""
+        tops = self.tops
+        rows = self.rows
+        first_kept = len(removed_rows)  # Rows above this are the new empty ones
+        for x in range(GRID_WIDTH):
+            top = tops[x]
+            if top == GRID_HEIGHT:
+                continue
+            if top not in removed_rows:
+                # The top block survived; it falls by the number of removed rows below it
+                tops[x] = top + sum(1 for y in removed_rows if y > top)
+            else:
+                # The top block was cleared: look for the next block down the column
+                bit = 1 << x
+                y = first_kept
+                while y < GRID_HEIGHT and not rows[y] & bit:
+                    y += 1
+                tops[x] = y
+
+    def add_garbage(self, count, hole, color=GRAY):
+        """Pushes the board up and fills the bottom count rows except column hole
+
+        Returns True if blocks were pushed off the top (the player topped out).
+        """
+        count = min(count, GRID_HEIGHT)
+        if count <= 0:
+            return False
+        rows = self.rows
+        colors = self.colors
+        overflow = any(rows[:count])
+
+        garbage_mask = FULL_MASK & ~(1 << hole)
+        garbage_colors = tuple(None if x == hole else color for x in range(GRID_WIDTH))
+        freed = colors[:count]
+        rows[:] = rows[count:] + [garbage_mask] * count
+        colors[:] = colors[count:] + freed
+        for color_row in freed:
+            color_row[:] = garbage_colors
+        self.frozen_colors[:] = self.frozen_colors[count:] + [garbage_colors] * count
+
+        # Every column moves up by count; only the hole column can stay empty
+        tops = self.tops
+        for x in range(GRID_WIDTH):
+            if count <= tops[x] < GRID_HEIGHT:
+                tops[x] -= count
+            elif tops[x] < count:
+                # The column's top block was pushed off; find the highest one left
+                bit = 1 << x
+                y = 0
+                while y < GRID_HEIGHT and not rows[y] & bit:
+                    y += 1
+                tops[x] = y
+            elif x != hole:
+                tops[x] = GRID_HEIGHT - count
+        self.version += 1
+        return overflow
+
+    def copy(self):
+        """Creates an independent copy of this board"""
+        new_board = Board.__new__(Board)
+        new_board.rows = self.rows[:]
+        new_board.colors = [row[:] for row in self.colors]
+        new_board.tops = self.tops[:]
+        new_board.frozen_colors = self.frozen_colors[:]
+        new_board.version = self.version
+        new_board.last_snapshot = self.last_snapshot
+        return new_board
+
+    def snapshot(self):
+        """Returns the board as an immutable BoardSnapshot
+
+        Only rows changed since the previous snapshot are turned into new
+        tuples, and an unchanged board gives back the same snapshot.
+        """
+        snapshot = self.last_snapshot
+        if snapshot is not None and snapshot.version == self.version:
+            return snapshot
+        frozen = self.frozen_colors
+        colors = self.colors
+        for y, color_row in enumerate(frozen):
+            if color_row is None:
+                frozen[y] = tuple(colors[y])
+        snapshot = BoardSnapshot(tuple(self.rows), tuple(frozen), tuple(self.tops), self.version)
+        self.last_snapshot = snapshot
+        return snapshot
+
+    def restore(self, snapshot):
+        """Makes this board equal to a snapshot (the snapshot itself is left alone)"""
+        self.rows[:] = snapshot.rows
+        self.colors = [list(color_row) for color_row in snapshot.colors]
+        self.frozen_colors = list(snapshot.colors)
+        self.tops[:] = snapshot.tops
+        # A new version, so caches keyed on it see the change
+        self.version += 1
+        self.last_snapshot = BoardSnapshot(snapshot.rows, snapshot.colors, snapshot.tops, self.version)
+
+
+class BoardSnapshot:
+    """Immutable board contents: row bitmasks, color rows and skyline as tuples"""
+
+    __slots__ = ('rows', 'colors', 'tops', 'version')
+
+    def __init__(self, rows, colors, tops, version=0):
+        self.rows = rows
+        self.colors = colors
+        self.tops = tops
+        self.version = version  # Board version it was taken at
+
+
+class EngineSnapshot:
+    """Everything needed to put a TetrisEngine back into an earlier state
+
+    piece is (shape name, x, y, rotation state). bag_state is None when
+    the snapshot was decoded from bytes; the bag is then rebuilt from the
+    seed by skipping pieces_taken pieces.
+    """
+
+    __slots__ = ('board', 'piece', 'next_piece_name', 'seed', 'bag_state', 'pieces_taken',
+                 'score', 'level', 'lines_cleared', 'pieces_placed', 'fall_time', 'fall_speed',
+                 'game_over')
+
+    def __init__(self, board, piece, next_piece_name, seed, bag_state, pieces_taken, score, level,
+                 lines_cleared, pieces_placed, fall_time, fall_speed, game_over):
+        self.board = board
+        self.piece = piece
+        self.next_piece_name = next_piece_name
+        self.seed = seed
+        self.bag_state = bag_state
+        self.pieces_taken = pieces_taken
+        self.score = score
+        self.level = level
+        self.lines_cleared = lines_cleared
+        self.pieces_placed = pieces_placed
+        self.fall_time = fall_time
+        self.fall_speed = fall_speed
+        self.game_over = game_over
+
+
+class FixedTimestep:
+    """Turns variable frame times into a whole number of fixed-length logic ticks
+
+    Each frame, advance(frame_time) returns how many ticks of tick_ms to run;
+    the leftover time stays in the accumulator, and alpha (0 to 1) says how
+    far the display is between the last tick and the next one.
+    """
+
+    def __init__(self, tick_rate=60, max_frame_time=250):
+        self.tick_ms = 1000 / tick_rate
+        # Longer frames (a stall, a dragged window) are cut short instead of
+        # being caught up with a burst of ticks
+        self.max_frame_time = max_frame_time
+        self.accumulator = 0.0
+
+    def advance(self, frame_time):
+        """Adds one frame's duration (ms) and returns the number of ticks due"""
+        self.accumulator += min(frame_time, self.max_frame_time)
+        ticks = int(self.accumulator // self.tick_ms)
+        self.accumulator -= ticks * self.tick_ms
+        return ticks
+
+    @property
+    def alpha(self):
+        """Fraction of a tick that has passed since the last one"""
+        return self.accumulator / self.tick_ms
+
+    def reset(self):
+        """Drops any leftover time"""
+        self.accumulator = 0.0
+
+
+class TetrisEngine:
+    """Game rules without any display: grid, pieces, scoring and levels
+
+    Subclasses (like the pygame TetrisGame) hook into rule events by
+    overriding on_lines_cleared() and on_piece_dropped().
+    """
+
+    def __init__(self, use_srs_kicks=False, seed=None):
+        # Use the WALL_KICK_DATA tables instead of the simplified kicks
+        self.use_srs_kicks = use_srs_kicks
+
+        # Optional ReplayRecorder (see tetris_replay.py) that is told about
+        # every action, gravity step and restart
+        self.recorder = None
+
+        # Every game has a known seed so it can be replayed
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+
+        # Game state
+        self.board = Board()
+        self.current_piece = None
+        self.next_piece_name = None
+        self.piece_bag = PieceBag(self.seed)
+        self.game_over = False
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.pieces_placed = 0
+
+        # Timing (piece falls automatically)
+        self.fall_time = 0
+        self.fall_speed = 500  # Milliseconds between automatic drops (gets faster with levels)
+
+        # Last ghost piece and the (board, version, piece position) it was computed for
+        self.ghost = None
+        self.ghost_key = None
+
+        # Spawn the first piece and prepare next piece
+        self.next_piece_name = self.piece_bag.get_next_piece()
+        self.spawn_piece()
+
+    @property
+    def grid(self):
+        """The color plane of the board, indexed as grid[y][x]"""
+        return self.board.colors
+
+    def on_lines_cleared(self, cleared_rows, leveled_up):
+        """Called after completed lines are removed and the score is updated"""
+        pass
+
+    def on_piece_dropped(self):
+        """Called after a hard drop, right before the piece locks"""
+        pass
+
+    def upcoming_pieces(self, count):
+        """Names of the next count pieces, starting with next_piece_name"""
+        if count <= 0:
+            return []
+        return [self.next_piece_name] + self.piece_bag.peek(count - 1)
+
+    def spawn_piece(self):
+        """Creates a new piece at the top of the grid"""
+        self.current_piece = Tetromino(self.next_piece_name)
+        self.next_piece_name = self.piece_bag.get_next_piece()
+
+        # Check if the new piece immediately collides (game over condition)
+        if self.check_collision(self.current_piece):
+            self.game_over = True
+
+    def check_collision(self, piece, offset_x=0, offset_y=0):
+        """Checks if a piece collides with the grid or boundaries"""
+        return rows_collide(self.board.rows, piece.rotation.masks, piece.x + offset_x, piece.y + offset_y)
+
+    def drop_distance(self, piece):
+        """How many rows a piece can fall before it lands
+
+        Uses the piece's bottom profile against the board's skyline; only a
+        piece tucked under an overhang falls back to walking down row by row.
+        """
+        tops = self.board.tops
+        distance = GRID_HEIGHT
+        for dx, dy in piece.rotation.bottoms:
+            gap = tops[piece.x + dx] - (piece.y + dy) - 1
+            if gap < 0:
+                # Below the column's highest block, so the skyline says nothing here
+                distance = 0
+                while not self.check_collision(piece, 0, distance + 1):
+                    distance += 1
+                return distance
+            if gap < distance:
+                distance = gap
+        return distance
+
+    def get_ghost_piece(self):
+        """Returns the current piece at its drop position (cached; don't modify it)"""
+        piece = self.current_piece
+        if not piece:
+            return None
+
+        # Recompute only when the piece moved or the board changed
+        key = (self.board, self.board.version, piece.rotation, piece.x, piece.y)
+        if key != self.ghost_key:
+            ghost = piece.copy()
+            ghost.y += self.drop_distance(piece)
+            self.ghost_key = key
+            self.ghost = ghost
+        return self.ghost
+
+    def move_piece(self, dx, dy):
+        """Attempts to move the current piece by dx, dy"""
+        if not self.check_collision(self.current_piece, dx, dy):
+            self.current_piece.x += dx
+            self.current_piece.y += dy
+            return True
+        return False
+
+    def rotate_piece(self):
+        """Attempts to rotate the current piece using wall kicks with visual centering"""
+        piece = self.current_piece
+        if piece.shape_name == 'O':
+            return  # O piece doesn't rotate
+
+        rotation = piece.rotation
+        target = ROTATION_TABLE[piece.shape_name][rotation.next_state]
+
+        # Apply centering offset so the piece stays visually in place
+        x = piece.x + rotation.center_offset[0]
+        y = piece.y + rotation.center_offset[1]
+
+        # Try each wall kick offset; the first one that fits wins
+        kicks = rotation.srs_kicks if self.use_srs_kicks else rotation.kicks
+        for offset_x, offset_y in kicks:
+            if not rows_collide(self.board.rows, target.masks, x + offset_x, y + offset_y):
+                piece.rotation = target
+                piece.x = x + offset_x
+                piece.y = y + offset_y
+                return  # Success!
+
+        # All wall kicks failed, the piece stays as it was
+
+    def lock_piece(self):
+        """Locks the current piece into the grid"""
+        blocks = self.current_piece.get_blocks()
+        self.board.place(blocks, self.current_piece.color)
+        self.pieces_placed += 1
+
+        # Check for completed lines (only the rows the piece landed in can be full)
+        self.clear_lines(sorted({block[1] for block in blocks if 0 <= block[1] < GRID_HEIGHT}))
+
+        # Spawn a new piece
+        self.spawn_piece()
+
+    def clear_lines(self, rows_to_check=None):
+        """Removes completed lines, updates score and returns the cleared rows
+
+        rows_to_check (ascending) can limit the search to the rows that just
+        changed; by default the whole board is checked.
+        """
+        # Find all completed lines (a full row is just FULL_MASK)
+        lines_to_clear = self.board.full_rows(rows_to_check)
+
+        # Remove completed lines and add empty lines at the top
+        self.board.remove_rows(lines_to_clear)
+
+        # Update score and level
+        if lines_to_clear:
+            old_level = self.level
+            self.lines_cleared += len(lines_to_clear)
+            self.score += LINE_CLEAR_POINTS[len(lines_to_clear)] * self.level
+
+            # Increase level every 10 lines
+            self.level = self.lines_cleared // 10 + 1
+
+            # Make pieces fall faster as level increases
+            self.fall_speed = max(100, 500 - (self.level - 1) * 50)
+
+            self.on_lines_cleared(lines_to_clear, self.level > old_level)
+
+        return lines_to_clear
+
+    def drop_piece(self):
+        """Instantly drops the piece to the bottom"""
+        distance = self.drop_distance(self.current_piece)
+        self.current_piece.y += distance
+        self.score += distance  # Small bonus for hard dropping (1 point per row)
+        self.on_piece_dropped()
+        self.lock_piece()
+
+    def apply_gravity(self):
+        """Moves the piece down one row, locking it if it can't move"""
+        if not self.move_piece(0, 1):
+            self.lock_piece()
+
+    def update(self, delta_time):
+        """Advances the automatic fall timer by delta_time milliseconds"""
+        if self.recorder is not None:
+            self.recorder.advance(delta_time)
+        if self.game_over:
+            return
+
+        self.fall_time += delta_time
+        if self.fall_time >= self.fall_speed:
+            self.fall_time = 0
+            if self.recorder is not None:
+                self.recorder.record_gravity()
+            self.apply_gravity()
+
+    def step(self, action, auto_repeat=False):
+        """Applies one player action and returns how many lines it cleared
+
+        auto_repeat marks actions repeated by a held key (DAS) in recordings.
+        """
+        if self.game_over:
+            return 0
+        if self.recorder is not None and action != ACTION_NONE:
+            self.recorder.record_action(action, auto_repeat)
+
+        lines_before = self.lines_cleared
+        if action == ACTION_LEFT:
+            self.move_piece(-1, 0)
+        elif action == ACTION_RIGHT:
+            self.move_piece(1, 0)
+        elif action == ACTION_SOFT_DROP:
+            if self.move_piece(0, 1):
+                self.score += 1  # Small bonus for soft drop
+        elif action == ACTION_ROTATE:
+            self.rotate_piece()
+        elif action == ACTION_HARD_DROP:
+            self.drop_piece()
+        return self.lines_cleared - lines_before
+
+    def reset_game(self, seed=None):
+        """Resets the rules state for a new game (with a fresh seed unless one is given)"""
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        if self.recorder is not None:
+            self.recorder.record_restart(self.seed)
+        self.board = Board()
+        self.game_over = False
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.pieces_placed = 0
+        self.fall_speed = 500
+        self.piece_bag = PieceBag(self.seed)
+        self.next_piece_name = self.piece_bag.get_next_piece()
+        self.spawn_piece()
+
+    def snapshot(self):
+        """Returns an EngineSnapshot of the game (cheap: the board's unchanged rows are shared)"""
+        piece = self.current_piece
+        bag_state = self.piece_bag.get_state()
+        return EngineSnapshot(
+            self.board.snapshot(),
+            (piece.shape_name, piece.x, piece.y, piece.rotation_state) if piece else None,
+            self.next_piece_name, self.seed, bag_state, bag_state[2], self.score, self.level,
+            self.lines_cleared, self.pieces_placed, self.fall_time, self.fall_speed, self.game_over)
+
+    def restore(self, snapshot):
+        """Puts the game back into a snapshot's state (not recorded by a recorder)"""
+        self.board.restore(snapshot.board)
+        if snapshot.piece is None:
+            self.current_piece = None
+        else:
+            self.current_piece = Tetromino(*snapshot.piece)
+        self.next_piece_name = snapshot.next_piece_name
+        if snapshot.bag_state is not None:
+            self.piece_bag.set_state(snapshot.bag_state)
+        else:
+            self.piece_bag = PieceBag(snapshot.seed)
+            self.piece_bag.skip(snapshot.pieces_taken)
+        self.seed = snapshot.seed
+        self.score = snapshot.score
+        self.level = snapshot.level
+        self.lines_cleared = snapshot.lines_cleared
+        self.pieces_placed = snapshot.pieces_placed
+        self.fall_time = snapshot.fall_time
+        self.fall_speed = snapshot.fall_speed
+        self.game_over = snapshot.game_over
@@ -0,0 +1,292 @@
+"""Gym-style environments for training agents on the Tetris rules.
+
+TetrisEnv wraps a TetrisEngine (the game logic TetrisGame draws) with
+reset(seed) / step(action) in the gymnasium style. Observations are a dict
+of NumPy arrays that are allocated once and overwritten in place on every
+step, so copy them if you need to keep one:
+
+    board           (GRID_HEIGHT, GRID_WIDTH) uint8, 1 where a block is
+    pieces          (2,) int8, current and next piece ids (index in SHAPES)
+    piece_position  (3,) int16, current piece x, y and rotation state
+    heights         (GRID_WIDTH,) int8, column heights
+    features        (4,) float32, holes, bumpiness, aggregate height, max height
+
+VectorTetrisEnv runs many environments in worker processes. Every
+observation array lives in shared memory and the workers write straight
+into it, so only tiny commands go through the pipes (boards are never
+pickled).
+"""
+import multiprocessing
+import random
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from tetris_engine import GRID_WIDTH, GRID_HEIGHT, SHAPE_IDS, ACTION_HARD_DROP, TetrisEngine
+
+ACTION_COUNT = ACTION_HARD_DROP + 1  # ACTION_NONE .. ACTION_HARD_DROP
+
+# name: (shape of one observation, dtype)
+OBSERVATION_SPEC = {
+    'board': ((GRID_HEIGHT, GRID_WIDTH), np.uint8),
+    'pieces': ((2,), np.int8),
+    'piece_position': ((3,), np.int16),
+    'heights': ((GRID_WIDTH,), np.int8),
+    'features': ((4,), np.float32),
+}
+
+COLUMN_SHIFTS = np.arange(GRID_WIDTH, dtype=np.int32)
+
+
+def allocate_observation():
+    """A fresh set of observation arrays"""
+    return {name: np.zeros(shape, dtype) for name, (shape, dtype) in OBSERVATION_SPEC.items()}
+
+
+class TetrisEnv:
+    """Single game with reset(seed) -> (obs, info) and step(action) -> (obs, reward, terminated, truncated, info)
+
+    Actions are the engine's ACTION_* codes. After the action the piece
+    falls one row every gravity_interval steps (0 turns gravity off).
+    The reward is the score gained. observation can be a dict of existing
+    arrays (for example views into shared memory) to write into.
+    """
+
+    def __init__(self, use_srs_kicks=False, gravity_interval=1, max_steps=None, observation=None):
+        self.use_srs_kicks = use_srs_kicks
+        self.gravity_interval = gravity_interval
+        self.max_steps = max_steps
+        self.observation = observation if observation is not None else allocate_observation()
+        self.engine = None
+        self.seed_rng = None
+        self.steps = 0
+        # Scratch space for unpacking row bitmasks into the board array
+        self.row_buffer = np.zeros((GRID_HEIGHT, 1), dtype=np.int32)
+        self.bit_buffer = np.zeros((GRID_HEIGHT, GRID_WIDTH), dtype=np.int32)
+
+    def reset(self, seed=None):
+        """Starts a new game; a seed also seeds the games after it"""
+        if seed is not None:
+            self.seed_rng = random.Random(seed)
+        elif self.seed_rng is not None:
+            seed = self.seed_rng.randrange(1 << 32)
+        self.engine = TetrisEngine(use_srs_kicks=self.use_srs_kicks, seed=seed)
+        self.steps = 0
+        self.update_observation()
+        return self.observation, {'seed': self.engine.seed}
+
+    def step(self, action):
+        """Applies one action (then gravity) and returns the new observation"""
+        engine = self.engine
+        score_before = engine.score
+        lines = engine.step(int(action))
+        self.steps += 1
+        if self.gravity_interval and self.steps % self.gravity_interval == 0 and not engine.game_over:
+            lines_before = engine.lines_cleared
+            engine.apply_gravity()
+            lines += engine.lines_cleared - lines_before
+
+        self.update_observation()
+        truncated = self.max_steps is not None and self.steps >= self.max_steps
+        return (self.observation, engine.score - score_before, engine.game_over, truncated,
+                {'lines': lines})
+
+    def update_observation(self):
+        """Writes the engine state into the observation arrays"""
+        engine = self.engine
+        observation = self.observation
+        board = engine.board
+        rows = board.rows
+
+        # Row bitmasks -> binary board, without allocating
+        self.row_buffer[:, 0] = rows
+        np.right_shift(self.row_buffer, COLUMN_SHIFTS, out=self.bit_buffer)
+        np.bitwise_and(self.bit_buffer, 1, out=self.bit_buffer)
+        np.copyto(observation['board'], self.bit_buffer, casting='unsafe')
+
+        piece = engine.current_piece
+        observation['pieces'][0] = SHAPE_IDS[piece.shape_name]
+        observation['pieces'][1] = SHAPE_IDS[engine.next_piece_name]
+        position = observation['piece_position']
+        position[0] = piece.x
+        position[1] = piece.y
+        position[2] = piece.rotation_state
+
+        # Column heights come straight from the board's skyline
+        heights = observation['heights']
+        total_height = 0
+        max_height = 0
+        bumpiness = 0
+        previous = None
+        for x, top in enumerate(board.tops):
+            height = GRID_HEIGHT - top
+            heights[x] = height
+            total_height += height
+            max_height = max(max_height, height)
+            if previous is not None:
+                bumpiness += abs(height - previous)
+            previous = height
+
+        # Holes: empty cells with a block somewhere above them
+        holes = 0
+        covered = 0
+        for row in rows:
+            holes += bin(covered & ~row).count('1')
+            covered |= row
+
+        features = observation['features']
+        features[0] = holes
+        features[1] = bumpiness
+        features[2] = total_height
+        features[3] = max_height
+
+
+def _worker(connection, memory_names, first, count, use_srs_kicks, gravity_interval, max_steps):
+    """Worker process: runs envs first..first+count-1 writing into shared memory"""
+    blocks = {name: shared_memory.SharedMemory(name=memory_name)
+              for name, memory_name in memory_names.items()}
+    arrays = VectorTetrisEnv.shared_arrays(blocks, first + count)
+    envs = [TetrisEnv(use_srs_kicks, gravity_interval, max_steps,
+                      {name: arrays[name][index] for name in OBSERVATION_SPEC})
+            for index in range(first, first + count)]
+    try:
+        while True:
+            command, argument = connection.recv()
+            if command == 'reset':
+                for index, env in enumerate(envs, first):
+                    _, info = env.reset(argument[index])
+                    arrays['seeds'][index] = info['seed']
+            elif command == 'step':
+                actions = arrays['actions']
+                for index, env in enumerate(envs, first):
+                    _, reward, terminated, truncated, info = env.step(actions[index])
+                    arrays['rewards'][index] = reward
+                    arrays['terminated'][index] = terminated
+                    arrays['truncated'][index] = truncated
+                    arrays['lines'][index] = info['lines']
+                    if terminated or truncated:
+                        # Start the next game right away; its first observation replaces the last one
+                        _, info = env.reset()
+                        arrays['seeds'][index] = info['seed']
+            elif command == 'close':
+                break
+            connection.send(True)
+    finally:
+        # Drop every view into the blocks before closing them
+        envs = arrays = None
+        for block in blocks.values():
+            block.close()
+
+
+class VectorTetrisEnv:
+    """num_envs games stepped in num_workers processes over shared memory
+
+    reset(seeds) and step(actions) return views of the shared arrays:
+    observations are dicts of arrays with a leading num_envs axis. Finished
+    games restart automatically (with the next seed from their own
+    sequence) and report terminated/truncated for that step.
+    """
+
+    # Extra per-env arrays besides the observation: name: dtype
+    STEP_ARRAYS = {
+        'actions': np.int8,
+        'rewards': np.float64,
+        'terminated': np.bool_,
+        'truncated': np.bool_,
+        'lines': np.int16,
+        'seeds': np.int64,
+    }
+
+    def __init__(self, num_envs, num_workers=None, use_srs_kicks=False, gravity_interval=1,
+                 max_steps=None):
+        self.num_envs = num_envs
+        num_workers = min(num_envs, num_workers or multiprocessing.cpu_count())
+
+        self.blocks = {}
+        for name, size in self.array_sizes(num_envs).items():
+            self.blocks[name] = shared_memory.SharedMemory(create=True, size=max(1, size))
+        self.arrays = self.shared_arrays(self.blocks, num_envs)
+        self.observation = {name: self.arrays[name] for name in OBSERVATION_SPEC}
+
+        # Split the envs into contiguous slices, one per worker
+        memory_names = {name: block.name for name, block in self.blocks.items()}
+        self.connections = []
+        self.processes = []
+        per_worker, extra = divmod(num_envs, num_workers)
+        first = 0
+        for worker in range(num_workers):
+            count = per_worker + (1 if worker < extra else 0)
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker, daemon=True,
+                args=(child, memory_names, first, count, use_srs_kicks, gravity_interval, max_steps))
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+            first += count
+
+    @classmethod
+    def array_sizes(cls, num_envs):
+        """Bytes needed for each shared array"""
+        sizes = {}
+        for name, (shape, dtype) in OBSERVATION_SPEC.items():
+            sizes[name] = num_envs * int(np.prod(shape)) * np.dtype(dtype).itemsize
+        for name, dtype in cls.STEP_ARRAYS.items():
+            sizes[name] = num_envs * np.dtype(dtype).itemsize
+        return sizes
+
+    @classmethod
+    def shared_arrays(cls, blocks, num_envs):
+        """NumPy views over the shared memory blocks"""
+        arrays = {}
+        for name, (shape, dtype) in OBSERVATION_SPEC.items():
+            arrays[name] = np.ndarray((num_envs,) + shape, dtype, buffer=blocks[name].buf)
+        for name, dtype in cls.STEP_ARRAYS.items():
+            arrays[name] = np.ndarray((num_envs,), dtype, buffer=blocks[name].buf)
+        return arrays
+
+    def _broadcast(self, command, argument=None):
+        for connection in self.connections:
+            connection.send((command, argument))
+        for connection in self.connections:
+            connection.recv()
+
+    def reset(self, seeds=None):
+        """Starts every game (seeds: one per env, or None for random ones)"""
+        if seeds is None:
+            seeds = [None] * self.num_envs
+        self._broadcast('reset', list(seeds))
+        return self.observation, {'seeds': self.arrays['seeds']}
+
+    def step(self, actions):
+        """Applies one action per env; returns (obs, rewards, terminated, truncated, info)"""
+        self.arrays['actions'][:] = actions
+        self._broadcast('step')
+        arrays = self.arrays
+        return (self.observation, arrays['rewards'], arrays['terminated'], arrays['truncated'],
+                {'lines': arrays['lines'], 'seeds': arrays['seeds']})
+
+    def close(self):
+        """Stops the workers and frees the shared memory"""
+        if not self.processes:
+            return
+        for connection in self.connections:
+            connection.send(('close', None))
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        self.observation = None
+        self.arrays = None
+        for block in self.blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                pass  # The caller still holds a view; the memory goes when that does
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,238 @@
+"""Enumerates every resting position a piece can reach on a board.
+
+This is the inner loop of the bots, so it works directly on the board's row
+bitmasks and the precomputed ROTATION_TABLE: a breadth-first search over
+(x, y, rotation_state) with a flat visited array, using exactly the same
+moves as the engine (left, right, soft drop and clockwise rotation with the
+engine's centering and kicks).
+
+Usage (checks that no two placements fill the same cells):
+    python tetris_placements.py check --boards 200
+"""
+import argparse
+import random
+import sys
+from collections import deque
+
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT, FULL_MASK, SHAPES, ROTATION_TABLE,
+    ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP, ACTION_ROTATE, ACTION_HARD_DROP,
+    rows_collide,
+)
+
+# Search window for piece positions: rotated cells reach up to 3 columns left
+# of the piece origin, and kicks/centering can lift a piece above the grid
+X_MIN = -4
+X_RANGE = GRID_WIDTH + 8
+Y_MIN = -8
+Y_RANGE = GRID_HEIGHT + 12
+STATE_COUNT = 4 * Y_RANGE * X_RANGE
+
+
+class Placement:
+    """One reachable resting position and the board it leaves behind"""
+
+    __slots__ = ('x', 'y', 'rotation_state', 'rows', 'lines_cleared', 'actions')
+
+    def __init__(self, x, y, rotation_state, rows, lines_cleared, actions=None):
+        self.x = x
+        self.y = y
+        self.rotation_state = rotation_state
+        self.rows = rows  # Row bitmasks after locking and clearing lines (a tuple)
+        self.lines_cleared = lines_cleared
+        self.actions = actions  # Actions from the start position, ending in a hard drop
+
+    def __repr__(self):
+        return 'Placement(x={}, y={}, rotation_state={}, lines_cleared={})'.format(
+            self.x, self.y, self.rotation_state, self.lines_cleared)
+
+
+def lock_rows(rows, masks, x, y):
+    """Returns (rows after placing the piece and clearing full lines, lines cleared)"""
+    new_rows = list(rows)
+    min_x, _, row_masks = masks
+    shift = x + min_x
+    for dy, mask in row_masks:
+        if y + dy >= 0:
+            new_rows[y + dy] |= mask << shift
+
+    kept = [row for row in new_rows if row != FULL_MASK]
+    lines = GRID_HEIGHT - len(kept)
+    if lines:
+        kept[0:0] = [0] * lines
+    return tuple(kept), lines
+
+
+def _encode(x, y, rotation_state):
+    """Packs a piece position into an index of the visited array (-1 if outside the window)"""
+    if not (X_MIN <= x < X_MIN + X_RANGE and Y_MIN <= y < Y_MIN + Y_RANGE):
+        return -1
+    return (rotation_state * Y_RANGE + (y - Y_MIN)) * X_RANGE + (x - X_MIN)
+
+
+def _decode(state):
+    """Inverse of _encode"""
+    rest, x = divmod(state, X_RANGE)
+    rotation_state, y = divmod(rest, Y_RANGE)
+    return x + X_MIN, y + Y_MIN, rotation_state
+
+
+def _path_to(state, parents, parent_actions):
+    """Follows BFS parent links back to the start and returns the actions in order
+
+    Soft drops straight before the hard drop are left out, since the hard
+    drop lands in the same place without them.
+    """
+    actions = [ACTION_HARD_DROP]
+    while parents[state] != state:
+        action = parent_actions[state]
+        if action != ACTION_SOFT_DROP or len(actions) > 1:
+            actions.append(action)
+        state = parents[state]
+    actions.reverse()
+    return tuple(actions)
+
+
+def enumerate_placements(rows, shape_name, x=GRID_WIDTH // 2 - 1, y=0, rotation_state=0,
+                         use_srs_kicks=False, with_paths=False, cache=None):
+    """Returns every unique resting Placement reachable from the given piece position
+
+    rows are the board's row bitmasks (board.rows). The default position is
+    where the engine spawns pieces. Placements that fill exactly the same
+    cells are reported once (the first, i.e. shortest, way to reach them).
+    With with_paths=True each Placement also carries the action sequence.
+    Returns an empty list if the piece can't even be placed at the start.
+
+    An optional TranspositionCache returns the (shared, not to be modified)
+    list from an earlier call on the same board and start position.
+    """
+    if cache is not None:
+        key = (cache.make_key(rows, shape_name), x, y, rotation_state, use_srs_kicks, with_paths)
+        placements = cache.get(key)
+        if placements is None:
+            placements = enumerate_placements(rows, shape_name, x, y, rotation_state,
+                                              use_srs_kicks, with_paths)
+            cache.put(key, placements)
+        return placements
+
+    rotations = ROTATION_TABLE[shape_name]
+    can_rotate = shape_name != 'O'
+
+    start = _encode(x, y, rotation_state)
+    if start < 0 or rows_collide(rows, rotations[rotation_state].masks, x, y):
+        return []
+
+    visited = bytearray(STATE_COUNT)
+    visited[start] = 1
+    if with_paths:
+        parents = {start: start}
+        parent_actions = {}
+    queue = deque((start,))
+    seen_locks = set()
+    placements = []
+
+    while queue:
+        state = queue.popleft()
+        x, y, rotation_state = _decode(state)
+        rotation = rotations[rotation_state]
+        masks = rotation.masks
+
+        # A position that can't move down is where a hard drop would lock
+        if rows_collide(rows, masks, x, y + 1):
+            new_rows, lines = lock_rows(rows, masks, x, y)
+            min_x, _, row_masks = masks
+            # The filled cells as (row, bits) pairs, so rotations covering the same cells match
+            shift = x + min_x
+            lock_key = tuple((y + dy, mask << shift) for dy, mask in row_masks)
+            if lock_key not in seen_locks:
+                seen_locks.add(lock_key)
+                actions = _path_to(state, parents, parent_actions) if with_paths else None
+                placements.append(Placement(x, y, rotation_state, new_rows, lines, actions))
+            next_moves = ((x - 1, y, ACTION_LEFT), (x + 1, y, ACTION_RIGHT))
+        else:
+            next_moves = ((x - 1, y, ACTION_LEFT), (x + 1, y, ACTION_RIGHT),
+                          (x, y + 1, ACTION_SOFT_DROP))
+
+        # Clockwise rotation, exactly like TetrisEngine.rotate_piece. It is queued before the
+        # moves (and soft drop last), so paths turn and shift the piece before dropping it
+        if can_rotate:
+            target = rotations[rotation.next_state]
+            base_x = x + rotation.center_offset[0]
+            base_y = y + rotation.center_offset[1]
+            for offset_x, offset_y in (rotation.srs_kicks if use_srs_kicks else rotation.kicks):
+                if not rows_collide(rows, target.masks, base_x + offset_x, base_y + offset_y):
+                    next_state = _encode(base_x + offset_x, base_y + offset_y, target.state)
+                    if next_state >= 0 and not visited[next_state]:
+                        visited[next_state] = 1
+                        queue.append(next_state)
+                        if with_paths:
+                            parents[next_state] = state
+                            parent_actions[next_state] = ACTION_ROTATE
+                    break
+
+        for next_x, next_y, action in next_moves:
+            next_state = _encode(next_x, next_y, rotation_state)
+            if next_state >= 0 and not visited[next_state] and \
+                    not rows_collide(rows, masks, next_x, next_y):
+                visited[next_state] = 1
+                queue.append(next_state)
+                if with_paths:
+                    parents[next_state] = state
+                    parent_actions[next_state] = action
+
+    return placements
+
+
+def engine_placements(engine, with_paths=False, cache=None):
+    """Placements for the engine's current piece from where it is right now"""
+    piece = engine.current_piece
+    return enumerate_placements(engine.board.rows, piece.shape_name, piece.x, piece.y,
+                                piece.rotation_state, engine.use_srs_kicks, with_paths, cache)
+
+
+def placement_cells(shape_name, placement):
+    """The cells a placement fills, as a frozenset of (x, y)"""
+    cells = ROTATION_TABLE[shape_name][placement.rotation_state].cells
+    return frozenset((placement.x + cell[0], placement.y + cell[1]) for cell in cells)
+
+
+def duplicate_placements(rows, shape_name, use_srs_kicks=False):
+    """Number of placements on the board that fill the same cells as an earlier one"""
+    placements = enumerate_placements(rows, shape_name, use_srs_kicks=use_srs_kicks)
+    return len(placements) - len({placement_cells(shape_name, placement) for placement in placements})
+
+
+def random_rows(rng):
+    """A random board of row bitmasks with a ragged surface and no full rows"""
+    rows = [0] * GRID_HEIGHT
+    for x in range(GRID_WIDTH):
+        for y in range(GRID_HEIGHT - rng.randrange(GRID_HEIGHT // 2), GRID_HEIGHT):
+            if rng.random() < 0.8:
+                rows[y] |= 1 << x
+    return [row if row != FULL_MASK else row & ~(1 << rng.randrange(GRID_WIDTH)) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check piece placement enumeration')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check_parser = subparsers.add_parser('check', help='look for placements that fill the same cells')
+    check_parser.add_argument('--boards', type=int, default=100, help='random boards besides the empty one')
+    check_parser.add_argument('--seed', type=int, default=0, help='seed for the random boards')
+    check_parser.add_argument('--srs', action='store_true', help='use the SRS wall kick tables')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    boards = [[0] * GRID_HEIGHT] + [random_rows(rng) for _ in range(args.boards)]
+    failures = 0
+    for shape_name in SHAPES:
+        duplicates = sum(duplicate_placements(rows, shape_name, args.srs) for rows in boards)
+        empty_count = len(enumerate_placements(boards[0], shape_name, use_srs_kicks=args.srs))
+        print('{}: {} placements on the empty board, {} duplicates on {} boards'.format(
+            shape_name, empty_count, duplicates, len(boards)))
+        if duplicates:
+            failures += 1
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
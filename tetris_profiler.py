@@ -0,0 +1,126 @@
+"""Opt-in frame profiler: per-phase timings and per-frame counters.
+
+The game loop wraps each phase in `with profiler.phase('name'):` and calls
+end_frame() once per frame. Rolling p50/p95/p99 over the last `window`
+frames feed the on-screen overlay. With keep_history=True every frame is
+also kept for export as CSV or JSON; otherwise memory stays bounded by the
+window. Phases may nest (lock_piece runs inside gravity), so their
+times are inclusive. While disabled, phase() returns a shared no-op context
+and count() returns straight away.
+"""
+import contextlib
+import csv
+import json
+import time
+from collections import deque
+
+# Phases in display/export order
+PHASES = ('frame', 'events', 'das', 'gravity', 'lock_piece', 'clear_lines', 'particle_update',
+          'draw_grid', 'draw_ghost_piece', 'particle_draw', 'ui', 'flip')
+COUNTERS = ('check_collision',)
+
+_NO_OP = contextlib.nullcontext()
+
+
+class _PhaseTimer:
+    """Context manager that adds its elapsed time to one phase of the current frame"""
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        current = self.profiler.current
+        current[self.name] = current.get(self.name, 0.0) + (time.perf_counter() - self.start) * 1000
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class FrameProfiler:
+    """Collects phase times (ms) and counters for each frame"""
+
+    def __init__(self, enabled=False, window=300, keep_history=False):
+        self.enabled = enabled
+        self.keep_history = keep_history
+        self.window = window
+        self.timers = {}
+        self.current = {}  # Phase times and counters of the frame in progress
+        self.recent = {name: deque(maxlen=window) for name in PHASES + COUNTERS}
+        self.frames = []  # Every finished frame, for export (only with keep_history)
+
+    def phase(self, name):
+        """Context manager timing one phase (a no-op while disabled)"""
+        if not self.enabled:
+            return _NO_OP
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = _PhaseTimer(self, name)
+        return timer
+
+    def count(self, name, amount=1):
+        """Adds to a per-frame counter"""
+        if self.enabled:
+            self.current[name] = self.current.get(name, 0) + amount
+
+    def end_frame(self):
+        """Closes the current frame and adds it to the rolling window (and the history)"""
+        if not self.enabled:
+            if self.current:
+                self.current = {}  # Drop a frame cut short by turning the profiler off
+            return
+        frame = self.current
+        self.current = {}
+        for name, values in self.recent.items():
+            values.append(frame.get(name, 0))
+        if self.keep_history:
+            self.frames.append(frame)
+
+    def stats(self):
+        """Rolling p50/p95/p99 of every phase and counter as {name: (p50, p95, p99)}"""
+        stats = {}
+        for name, values in self.recent.items():
+            ordered = sorted(values)
+            stats[name] = (percentile(ordered, 0.50), percentile(ordered, 0.95), percentile(ordered, 0.99))
+        return stats
+
+    def summary(self):
+        """Percentiles over every recorded frame (for export)"""
+        summary = {'frames': len(self.frames)}
+        for name in PHASES + COUNTERS:
+            ordered = sorted(frame.get(name, 0) for frame in self.frames)
+            summary[name] = {
+                'p50': percentile(ordered, 0.50),
+                'p95': percentile(ordered, 0.95),
+                'p99': percentile(ordered, 0.99),
+                'max': ordered[-1] if ordered else 0,
+            }
+        return summary
+
+    def export(self, path):
+        """Writes per-frame rows as CSV (.csv) or the summary plus frames as JSON"""
+        columns = PHASES + COUNTERS
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(('frame_number',) + columns)
+                for number, frame in enumerate(self.frames):
+                    writer.writerow([number] + [frame.get(name, 0) for name in columns])
+        else:
+            with open(path, 'w') as f:
+                json.dump({
+                    'summary': self.summary(),
+                    'columns': columns,
+                    'frames': [[frame.get(name, 0) for name in columns] for frame in self.frames],
+                }, f)
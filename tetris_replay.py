@@ -0,0 +1,230 @@
+"""Compact replay recording and fast headless playback.
+
+A replay is the game seed followed by every event that changed the engine:
+player actions (including DAS repeats), gravity steps and restarts. Each
+event is one opcode byte plus the milliseconds since the previous event as
+a varint, so a typical game takes only a few bytes per piece.
+
+File layout:
+    b'TRPL', version byte, flags byte (bit 0: SRS kicks), varint seed
+    events: opcode byte, varint delta_ms [, varint seed for OP_RESTART]
+    OP_END, varint score, lines, level, pieces, then one varint per board row
+
+Usage:
+    python tetris_replay.py verify game1.trpl game2.trpl ...
+"""
+import sys
+
+from tetris_engine import GRID_HEIGHT, ACTION_HARD_DROP, TetrisEngine
+
+MAGIC = b'TRPL'
+VERSION = 1
+FLAG_SRS_KICKS = 0x01
+
+# Opcodes 1-5 are the engine's ACTION_* values
+OP_END = 0
+OP_GRAVITY = 6
+OP_RESTART = 7
+OP_AUTO_REPEAT = 0x80  # Set on actions produced by DAS (playback treats them the same)
+
+
+class ReplayError(Exception):
+    """Raised for malformed replay data"""
+    pass
+
+
+def write_varint(buffer, value):
+    """Appends a non-negative int to a bytearray as a little-endian base-128 varint"""
+    if value < 0:
+        raise ValueError('varints must be non-negative, got {}'.format(value))
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, position):
+    """Reads a varint from data (bytes, bytearray, memoryview or mmap); returns (value, new position)"""
+    value = 0
+    shift = 0
+    while True:
+        try:
+            byte = data[position]
+        except IndexError:
+            raise ReplayError('replay data ends in the middle of a number')
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+class ReplayRecorder:
+    """Collects engine events into the compact replay format
+
+    Attach it with engine.recorder = ReplayRecorder(engine.seed, ...); the
+    engine then reports every action, gravity step, restart and elapsed time.
+    """
+
+    def __init__(self, seed, use_srs_kicks=False):
+        self.data = bytearray(MAGIC)
+        self.data.append(VERSION)
+        self.data.append(FLAG_SRS_KICKS if use_srs_kicks else 0)
+        write_varint(self.data, seed)
+        self.pending_ms = 0  # Time since the last recorded event
+        self.finished = False
+
+    def advance(self, delta_time):
+        """Adds elapsed game time (ms) before the next event"""
+        self.pending_ms += delta_time
+
+    def record(self, opcode):
+        """Appends one event with the time elapsed since the previous one"""
+        elapsed = int(self.pending_ms)
+        self.pending_ms -= elapsed
+        self.data.append(opcode)
+        write_varint(self.data, elapsed)
+
+    def record_action(self, action, auto_repeat=False):
+        """Records a player action (auto_repeat marks DAS repeats)"""
+        self.record(action | OP_AUTO_REPEAT if auto_repeat else action)
+
+    def record_gravity(self):
+        """Records one automatic fall step"""
+        self.record(OP_GRAVITY)
+
+    def record_restart(self, seed):
+        """Records a restart and the seed of the new game"""
+        self.record(OP_RESTART)
+        write_varint(self.data, seed)
+
+    def finish(self, engine):
+        """Appends the final state of the engine and returns the replay bytes"""
+        if not self.finished:
+            self.record(OP_END)
+            for value in (engine.score, engine.lines_cleared, engine.level, engine.pieces_placed):
+                write_varint(self.data, value)
+            for row in engine.board.rows:
+                write_varint(self.data, row)
+            self.finished = True
+        return bytes(self.data)
+
+    def save(self, path, engine):
+        """Finishes the recording and writes it to a file"""
+        with open(path, 'wb') as f:
+            f.write(self.finish(engine))
+
+
+class ReplaySummary:
+    """Final state stored at the end of a replay"""
+
+    def __init__(self, score, lines, level, pieces, rows):
+        self.score = score
+        self.lines = lines
+        self.level = level
+        self.pieces = pieces
+        self.rows = rows
+
+    def matches(self, engine):
+        """Checks if an engine ended in exactly this state"""
+        return (engine.score == self.score and engine.lines_cleared == self.lines and
+                engine.level == self.level and engine.pieces_placed == self.pieces and
+                tuple(engine.board.rows) == self.rows)
+
+
+def read_header(data, position=0):
+    """Parses the replay header; returns (seed, use_srs_kicks, position of the first event)"""
+    if bytes(data[position:position + 4]) != MAGIC:
+        raise ReplayError('not a replay (bad magic)')
+    if data[position + 4] != VERSION:
+        raise ReplayError('unsupported replay version {}'.format(data[position + 4]))
+    use_srs_kicks = bool(data[position + 5] & FLAG_SRS_KICKS)
+    seed, position = read_varint(data, position + 6)
+    return seed, use_srs_kicks, position
+
+
+def iter_events(data, position):
+    """Yields (opcode, delta_ms, seed or None) from the first event up to OP_END
+
+    The last item yielded is (OP_END, delta_ms, position of the summary).
+    """
+    while True:
+        try:
+            opcode = data[position]
+        except IndexError:
+            raise ReplayError('replay data ends without OP_END')
+        delta_ms, position = read_varint(data, position + 1)
+        if opcode == OP_RESTART:
+            seed, position = read_varint(data, position)
+            yield opcode, delta_ms, seed
+        elif opcode == OP_END:
+            yield opcode, delta_ms, position
+            return
+        else:
+            yield opcode, delta_ms, None
+
+
+def read_summary(data, position):
+    """Parses the final state that follows OP_END; returns (summary, end position)"""
+    values = []
+    for _ in range(4 + GRID_HEIGHT):
+        value, position = read_varint(data, position)
+        values.append(value)
+    return ReplaySummary(values[0], values[1], values[2], values[3], tuple(values[4:])), position
+
+
+def play_replay(data, position=0, engine_class=TetrisEngine):
+    """Replays a recording headlessly at full speed; returns (engine, summary, end position)
+
+    data may be any buffer (bytes, memoryview, mmap), so replays inside a
+    larger file can be decoded in place starting at position. engine_class
+    can be a TetrisEngine subclass that watches the game through its hooks.
+    """
+    seed, use_srs_kicks, position = read_header(data, position)
+    engine = engine_class(use_srs_kicks=use_srs_kicks, seed=seed)
+
+    for opcode, _, extra in iter_events(data, position):
+        if opcode == OP_END:
+            summary, position = read_summary(data, extra)
+            return engine, summary, position
+        if opcode == OP_GRAVITY:
+            if not engine.game_over:
+                engine.apply_gravity()
+        elif opcode == OP_RESTART:
+            engine.reset_game(extra)
+        else:
+            action = opcode & ~OP_AUTO_REPEAT
+            if not 0 < action <= ACTION_HARD_DROP:
+                raise ReplayError('unknown opcode {}'.format(opcode))
+            engine.step(action)
+
+
+def verify_replay(data, position=0):
+    """Replays a recording and checks it ends with the recorded score and board"""
+    engine, summary, _ = play_replay(data, position)
+    return summary.matches(engine)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] != 'verify':
+        print('usage: python tetris_replay.py verify REPLAY...')
+        sys.exit(2)
+
+    failures = 0
+    for path in sys.argv[2:]:
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            ok = verify_replay(data)
+        except ReplayError as error:
+            ok = False
+            print('{}: {}'.format(path, error))
+        if not ok:
+            failures += 1
+            print('{}: MISMATCH'.format(path))
+    print('{} replays checked, {} failed'.format(len(sys.argv) - 2, failures))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Self-play / tournament runner that spreads seeded games over processes.
+
+Every game gets its own seed, so any result can be reproduced on its own
+with play_game(seed, policy). Policies must be plain module-level functions
+so they can be sent to worker processes.
+
+Usage:
+    python tetris_runner.py --games 1000 --workers 8 --chunksize 16
+"""
+import argparse
+import functools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from tetris_engine import ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE, ACTION_HARD_DROP, TetrisEngine
+
+
+def random_policy(engine, rng):
+    """Picks a random rotation and column for the current piece"""
+    actions = [ACTION_ROTATE] * rng.randrange(4)
+    shift = rng.randrange(-5, 6)
+    actions += [ACTION_LEFT if shift < 0 else ACTION_RIGHT] * abs(shift)
+    actions.append(ACTION_HARD_DROP)
+    return actions
+
+
+def play_game(seed, policy=random_policy, max_pieces=1000, use_srs_kicks=False):
+    """Plays one game with the given policy and returns its final stats
+
+    The policy is called once per piece as policy(engine, rng) and returns
+    the actions for that piece; the piece is hard dropped if it is still
+    falling afterwards. rng is seeded from the game seed too.
+    """
+    engine = TetrisEngine(use_srs_kicks=use_srs_kicks, seed=seed)
+    rng = random.Random(seed)
+
+    while not engine.game_over and engine.pieces_placed < max_pieces:
+        pieces_before = engine.pieces_placed
+        for action in policy(engine, rng):
+            engine.step(action)
+            if engine.pieces_placed != pieces_before:
+                break
+        if engine.pieces_placed == pieces_before:
+            engine.step(ACTION_HARD_DROP)
+
+    return {
+        'seed': seed,
+        'score': engine.score,
+        'lines': engine.lines_cleared,
+        'level': engine.level,
+        'pieces': engine.pieces_placed,
+        'game_over': engine.game_over,
+    }
+
+
+def aggregate_results(results):
+    """Combines per-game stats into one summary (the games stay listed by seed)"""
+    results = sorted(results, key=lambda result: result['seed'])
+    count = len(results)
+    summary = {'games': count}
+    for key in ('score', 'lines', 'level', 'pieces'):
+        values = [result[key] for result in results]
+        summary['total_' + key] = sum(values)
+        summary['mean_' + key] = sum(values) / count if count else 0
+        summary['max_' + key] = max(values) if count else 0
+    summary['results'] = results
+    return summary
+
+
+def run_games(seeds, policy=random_policy, workers=None, chunksize=1, max_pieces=1000,
+              use_srs_kicks=False):
+    """Plays one game per seed across a process pool and aggregates the results
+
+    workers=None uses every core; workers=1 plays in this process, which is
+    handy for debugging a policy.
+    """
+    play = functools.partial(play_game, policy=policy, max_pieces=max_pieces,
+                             use_srs_kicks=use_srs_kicks)
+    if workers == 1:
+        results = [play(seed) for seed in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(play, seeds, chunksize=chunksize))
+    return aggregate_results(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run many seeded Tetris games in parallel')
+    parser.add_argument('--games', type=int, default=100, help='number of games to play')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--chunksize', type=int, default=1, help='games sent to a worker at once')
+    parser.add_argument('--max-pieces', type=int, default=1000, help='piece limit per game')
+    parser.add_argument('--srs', action='store_true', help='use the SRS wall kick tables')
+    parser.add_argument('--summary-only', action='store_true', help="don't list every game")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.games)
+    summary = run_games(seeds, workers=args.workers, chunksize=args.chunksize,
+                        max_pieces=args.max_pieces, use_srs_kicks=args.srs)
+    if args.summary_only:
+        del summary['results']
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
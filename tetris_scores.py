@@ -0,0 +1,172 @@
+"""High-score leaderboard stored in SQLite and written from a background thread.
+
+Every game is one row (player, score, lines, level, date) keyed by a game
+id, so a running game can keep submitting its latest score: submissions only
+go on a queue, and a writer thread commits them in batches, keeping just the
+newest update for each game. SQLite takes care of atomic writes and of
+several game instances sharing the same file.
+
+Usage:
+    python tetris_scores.py [--db tetris_scores.db] [--count 10]
+"""
+import argparse
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_DB = 'tetris_scores.db'
+BATCH_DELAY = 1.0  # Seconds the writer waits to collect more updates into one commit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    game_id TEXT PRIMARY KEY,
+    player TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_by_score ON scores (score DESC);
+"""
+
+
+def new_game_id():
+    """Unique id for one game's leaderboard row"""
+    return uuid.uuid4().hex
+
+
+class HighScoreStore:
+    """Ranked leaderboard with non-blocking submits
+
+    submit() can be called from the game loop as often as needed; close()
+    (or flush()) waits until everything submitted so far is on disk.
+    """
+
+    def __init__(self, path=DEFAULT_DB, legacy_json=None, batch_delay=BATCH_DELAY):
+        self.path = path
+        self.batch_delay = batch_delay
+
+        with self._connect() as connection:
+            # WAL lets other instances read while one of them writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+        connection.close()
+        if legacy_json:
+            self._import_legacy(legacy_json)
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name='high-score-writer', daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        # Wait for other instances' write locks instead of failing right away
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _import_legacy(self, json_path):
+        """Copies the score from the old single-value JSON file into an empty leaderboard"""
+        try:
+            with open(json_path, 'r') as f:
+                high_score = json.load(f).get('high_score', 0)
+        except (OSError, ValueError, AttributeError):
+            return
+        if high_score and self.best_score() == 0:
+            self._write_batch([('legacy', 'player', high_score, 0, 1,
+                                datetime.datetime.fromtimestamp(os.path.getmtime(json_path))
+                                .isoformat(timespec='seconds'))])
+
+    def _write_batch(self, rows):
+        """Stores rows of (game_id, player, score, lines, level, date) in one transaction"""
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO scores (game_id, player, score, lines, level, date) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        finally:
+            connection.close()
+
+    def _write_loop(self):
+        """Writer thread: collects queued submits for a moment, then commits them together"""
+        running = True
+        while running:
+            items = [self.queue.get()]
+            deadline = time.monotonic() + self.batch_delay
+            try:
+                while items[-1] is not None:
+                    items.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                pass
+            if items[-1] is None:
+                running = False
+
+            # Only the newest update of each game needs writing
+            latest = {}
+            for item in items:
+                if item is not None:
+                    latest[item[0]] = item
+            try:
+                if latest:
+                    self._write_batch(list(latest.values()))
+            except sqlite3.Error:
+                pass  # A locked or unwritable file shouldn't stop the game
+            for _ in items:
+                self.queue.task_done()
+
+    def submit(self, game_id, player, score, lines, level, date=None):
+        """Queues the latest result of a game (returns immediately)"""
+        if date is None:
+            date = datetime.datetime.now().isoformat(timespec='seconds')
+        self.queue.put((game_id, player, score, lines, level, date))
+
+    def flush(self):
+        """Blocks until every submitted result has been written"""
+        self.queue.join()
+
+    def close(self):
+        """Writes the remaining results and stops the writer thread"""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+
+    def best_score(self):
+        """Highest score on the leaderboard (0 if it's empty)"""
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT MAX(score) FROM scores').fetchone()
+        finally:
+            connection.close()
+        return row[0] or 0
+
+    def leaderboard(self, count=10):
+        """Top results as dicts with rank, player, score, lines, level and date"""
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                'SELECT player, score, lines, level, date FROM scores '
+                'ORDER BY score DESC, date LIMIT ?', (count,)).fetchall()
+        finally:
+            connection.close()
+        return [{'rank': rank, 'player': player, 'score': score, 'lines': lines,
+                 'level': level, 'date': date}
+                for rank, (player, score, lines, level, date) in enumerate(rows, 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the Tetris leaderboard')
+    parser.add_argument('--db', default=DEFAULT_DB, help='leaderboard database file')
+    parser.add_argument('--count', type=int, default=10, help='number of entries to show')
+    args = parser.parse_args()
+
+    store = HighScoreStore(args.db)
+    for entry in store.leaderboard(args.count):
+        print('{rank:>3}. {player:<16} {score:>8}  lines {lines:<5} level {level:<3} {date}'.format(**entry))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
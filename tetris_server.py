@@ -0,0 +1,494 @@
+"""Asyncio battle server: many Tetris matches played out in one process.
+
+Each room runs one engine per player (the same rules TetrisGame plays) and
+one shared tick loop advances every room at TICK_RATE. Players get the same
+piece order. Clearing 2 or more lines sends garbage rows to the opponents;
+they rise from the bottom when the opponent's next piece locks, unless
+that player's own clears cancel them first.
+
+Protocol (TCP, big-endian): every message is a u16 length followed by a
+type byte and the payload.
+    client -> server
+        MSG_JOIN   room name (utf-8); an empty name joins the next open room
+        MSG_INPUT  one byte per ACTION_* code, applied on the next tick
+    server -> client
+        MSG_START  your player index, player count, u32 seed, SRS flag
+        MSG_STATE  one player's changes: see STATE_HEADER, then
+                   (row, row bitmask) for every row that changed
+        MSG_END    winner's player index (NO_WINNER if nobody survived), or
+                   ROOM_BUSY right after MSG_JOIN if that room's match has
+                   already started (the client may join again with another name)
+
+Boards are sent as deltas: a state message goes out only when something
+changed, carries only the rows that differ from the last one sent, and
+all clients of a room get every player's updates.
+
+Usage:
+    python tetris_server.py serve --port 7777
+    python tetris_server.py bots --port 7777 --clients 200 --seconds 30
+"""
+import argparse
+import asyncio
+import random
+import struct
+import time
+
+from tetris_engine import (
+    GRID_HEIGHT, GRID_WIDTH, SHAPE_NAMES, SHAPE_IDS, ACTION_LEFT, ACTION_HARD_DROP,
+    TetrisEngine, FixedTimestep,
+)
+
+DEFAULT_PORT = 7777
+TICK_RATE = 60
+ROOM_SIZE = 2
+
+MSG_JOIN = 1
+MSG_INPUT = 2
+MSG_START = 3
+MSG_STATE = 4
+MSG_END = 5
+
+LENGTH = struct.Struct('>H')
+START = struct.Struct('>BBBIB')  # type, player, players, seed, srs flag
+# type, player, tick, score, lines, level, piece id, x, y, rotation, next piece id,
+# incoming garbage, game over flag, number of changed rows
+STATE_HEADER = struct.Struct('>BBIIHBBbbBBBBB')
+ROW = struct.Struct('>BH')  # row index, row bitmask
+END = struct.Struct('>BB')  # type, winner
+NO_WINNER = 255
+ROOM_BUSY = 254
+
+# Garbage rows sent for clearing 2, 3 or 4 lines at once
+GARBAGE_FOR_LINES = (0, 0, 1, 2, 4)
+
+# Inputs queued per player beyond this are dropped, and a client whose
+# unsent output grows past MAX_WRITE_BUFFER bytes is disconnected
+MAX_PENDING_INPUTS = 64
+MAX_WRITE_BUFFER = 256 * 1024
+
+
+def encode_message(payload):
+    """Prefixes a message with its length"""
+    return LENGTH.pack(len(payload)) + payload
+
+
+async def read_message(reader):
+    """Reads one message, returning None at end of stream"""
+    try:
+        header = await reader.readexactly(LENGTH.size)
+        return await reader.readexactly(LENGTH.unpack(header)[0])
+    except asyncio.IncompleteReadError:
+        return None
+
+
+class BattleEngine(TetrisEngine):
+    """TetrisEngine that sends garbage for multi-line clears and takes it in between pieces"""
+
+    def __init__(self, use_srs_kicks=False, seed=None, garbage_rng=None):
+        # Set before the engine spawns its first piece
+        self.outgoing_garbage = 0  # Rows earned, waiting for the room to send them
+        self.incoming_garbage = 0  # Rows waiting to rise on this board
+        self.garbage_rng = garbage_rng or random.Random(seed)
+        super().__init__(use_srs_kicks=use_srs_kicks, seed=seed)
+
+    def on_lines_cleared(self, cleared_rows, leveled_up):
+        """Turns a clear of 2+ lines into garbage, first cancelling any that is incoming"""
+        garbage = GARBAGE_FOR_LINES[len(cleared_rows)]
+        cancelled = min(garbage, self.incoming_garbage)
+        self.incoming_garbage -= cancelled
+        self.outgoing_garbage += garbage - cancelled
+
+    def spawn_piece(self):
+        """Raises incoming garbage (one hole per batch) before the next piece appears"""
+        if self.incoming_garbage:
+            hole = self.garbage_rng.randrange(GRID_WIDTH)
+            if self.board.add_garbage(self.incoming_garbage, hole):
+                self.game_over = True
+            self.incoming_garbage = 0
+        super().spawn_piece()
+
+
+class Player:
+    """One connection: its queued inputs and what was last sent about its board"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.room = None
+        self.index = 0
+        self.engine = None
+        self.inputs = []
+        self.sent_rows = None
+        self.sent_header = None
+
+    def send(self, message):
+        """Queues a message; slow readers that fall too far behind are dropped"""
+        writer = self.writer
+        if writer.is_closing():
+            return
+        writer.write(message)
+        if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            writer.close()
+
+
+class Room:
+    """A match between up to `size` players sharing a seed"""
+
+    def __init__(self, name, size, use_srs_kicks=False):
+        self.name = name
+        self.size = size
+        self.use_srs_kicks = use_srs_kicks
+        self.players = []
+        self.seed = None
+        self.tick_count = 0
+        self.running = False
+        self.finished = False
+
+    def start(self, seed):
+        """Gives every player a fresh engine on the same seed and announces the match"""
+        self.seed = seed
+        self.running = True
+        for index, player in enumerate(self.players):
+            player.index = index
+            player.engine = BattleEngine(self.use_srs_kicks, seed,
+                                         garbage_rng=random.Random(seed + index))
+            player.inputs = []
+            player.sent_rows = [0] * GRID_HEIGHT
+            player.sent_header = None
+            player.send(encode_message(START.pack(MSG_START, index, len(self.players), seed,
+                                                  int(self.use_srs_kicks))))
+        self.broadcast_changes()
+
+    def tick(self, tick_ms):
+        """Runs one logic tick for every player, passes garbage on and sends the changes"""
+        self.tick_count += 1
+        players = self.players
+        for player in players:
+            engine = player.engine
+            if engine.game_over:
+                continue
+            for action in player.inputs:
+                engine.step(action)
+            player.inputs.clear()
+            engine.update(tick_ms)
+
+            if engine.outgoing_garbage:
+                for opponent in players:
+                    if opponent is not player and not opponent.engine.game_over:
+                        opponent.engine.incoming_garbage += engine.outgoing_garbage
+                engine.outgoing_garbage = 0
+
+        self.broadcast_changes()
+
+        alive = [player for player in players if not player.engine.game_over]
+        if len(alive) <= (1 if len(players) > 1 else 0):
+            self.finish(alive[0].index if alive else NO_WINNER)
+
+    def broadcast_changes(self):
+        """Sends each player's changed rows and header to everyone in the room"""
+        for player in self.players:
+            message = self.state_message(player)
+            if message is not None:
+                for receiver in self.players:
+                    receiver.send(message)
+
+    def state_message(self, player):
+        """Encodes what changed on a player's board since the last message (None if nothing did)"""
+        engine = player.engine
+        piece = engine.current_piece
+        header = (engine.score, min(engine.lines_cleared, 0xFFFF), min(engine.level, 255),
+                  SHAPE_IDS[piece.shape_name], piece.x, piece.y, piece.rotation_state,
+                  SHAPE_IDS[engine.next_piece_name], min(engine.incoming_garbage, 255),
+                  int(engine.game_over))
+        rows = engine.board.rows
+        sent_rows = player.sent_rows
+        changed = [y for y in range(GRID_HEIGHT) if rows[y] != sent_rows[y]]
+        if not changed and header == player.sent_header:
+            return None
+
+        player.sent_header = header
+        parts = [STATE_HEADER.pack(MSG_STATE, player.index, self.tick_count, *header, len(changed))]
+        for y in changed:
+            parts.append(ROW.pack(y, rows[y]))
+            sent_rows[y] = rows[y]
+        return encode_message(b''.join(parts))
+
+    def finish(self, winner):
+        """Announces the winner; the players can join another room afterwards"""
+        self.running = False
+        self.finished = True
+        message = encode_message(END.pack(MSG_END, winner))
+        for player in self.players:
+            player.send(message)
+            player.room = None
+
+    def leave(self, player):
+        """A player disconnected: they lose if the match is on"""
+        if player in self.players:
+            if self.running:
+                player.engine.game_over = True
+            else:
+                self.players.remove(player)
+
+
+class TetrisServer:
+    """Accepts connections, groups players into rooms and ticks every running room"""
+
+    def __init__(self, room_size=ROOM_SIZE, tick_rate=TICK_RATE, use_srs_kicks=False, seed=None):
+        self.room_size = room_size
+        self.use_srs_kicks = use_srs_kicks
+        self.timestep = FixedTimestep(tick_rate)
+        self.seed_rng = random.Random(seed)
+        self.rooms = {}
+        self.open_room = None  # Room that unnamed joins go into
+        self.room_count = 0
+        self.server = None
+        self.tick_task = None
+        self.ticks = 0
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """Starts listening and ticking; returns the port actually used (port=0 picks one)"""
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        self.tick_task = asyncio.create_task(self.run_ticks())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stops accepting players and ticking"""
+        self.tick_task.cancel()
+        try:
+            await self.tick_task
+        except asyncio.CancelledError:
+            pass
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def run_ticks(self):
+        """Advances every running room in fixed ticks, sleeping between them"""
+        timestep = self.timestep
+        last = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            for _ in range(timestep.advance((now - last) * 1000)):
+                self.ticks += 1
+                for name, room in list(self.rooms.items()):
+                    if room.running:
+                        room.tick(timestep.tick_ms)
+                    if room.finished:
+                        del self.rooms[name]
+            last = now
+            await asyncio.sleep(max(0.0, (timestep.tick_ms - timestep.accumulator) / 1000))
+
+    def join(self, player, name):
+        """Puts a player in the named room (or the open one) and starts it once full"""
+        if not name:
+            if self.open_room is None or self.open_room.running or self.open_room.finished:
+                self.room_count += 1
+                self.open_room = Room('#{}'.format(self.room_count), self.room_size, self.use_srs_kicks)
+                self.rooms[self.open_room.name] = self.open_room
+            room = self.open_room
+        else:
+            room = self.rooms.get(name)
+            if room is not None and room.running:
+                # Match already under way; the player stays out of any room and may join again
+                player.send(encode_message(END.pack(MSG_END, ROOM_BUSY)))
+                return
+            if room is None or room.finished:  # A finished room waits for the tick loop to drop it
+                room = self.rooms[name] = Room(name, self.room_size, self.use_srs_kicks)
+        player.room = room
+        room.players.append(player)
+        if len(room.players) == room.size:
+            room.start(self.seed_rng.randrange(1 << 32))
+
+    async def handle_client(self, reader, writer):
+        """Reads one client's messages until it disconnects"""
+        player = Player(writer)
+        try:
+            while True:
+                message = await read_message(reader)
+                if not message:
+                    break
+                kind = message[0]
+                if kind == MSG_JOIN and player.room is None:
+                    self.join(player, message[1:].decode('utf-8', 'replace'))
+                elif kind == MSG_INPUT and player.room is not None and player.room.running:
+                    room_left = MAX_PENDING_INPUTS - len(player.inputs)
+                    player.inputs.extend(action for action in message[1:1 + room_left]
+                                         if ACTION_LEFT <= action <= ACTION_HARD_DROP)
+        except ConnectionError:
+            pass
+        finally:
+            if player.room is not None:
+                player.room.leave(player)
+            writer.close()
+
+
+class MirrorBoard:
+    """A client's copy of one player's state, rebuilt from state messages"""
+
+    def __init__(self):
+        self.rows = [0] * GRID_HEIGHT
+        self.tick = 0
+        self.score = 0
+        self.lines = 0
+        self.level = 1
+        self.piece = None  # (shape name, x, y, rotation)
+        self.next_piece_name = None
+        self.incoming_garbage = 0
+        self.game_over = False
+
+    def apply(self, message):
+        """Updates from a MSG_STATE message"""
+        (_, _, self.tick, self.score, self.lines, self.level, piece_id, x, y, rotation,
+         next_id, self.incoming_garbage, game_over, count) = STATE_HEADER.unpack_from(message)
+        self.piece = (SHAPE_NAMES[piece_id], x, y, rotation)
+        self.next_piece_name = SHAPE_NAMES[next_id]
+        self.game_over = bool(game_over)
+        offset = STATE_HEADER.size
+        for _ in range(count):
+            row, mask = ROW.unpack_from(message, offset)
+            self.rows[row] = mask
+            offset += ROW.size
+
+
+class ScriptedClient:
+    """Plays one match over TCP by sending actions from a seeded random script
+
+    Keeps a MirrorBoard of every player in the room, so it can check that
+    the deltas add up to the server's boards.
+    """
+
+    def __init__(self, script_seed=None, actions_per_message=2):
+        self.rng = random.Random(script_seed)
+        self.actions_per_message = actions_per_message
+        self.reader = None
+        self.writer = None
+        self.index = None
+        self.seed = None
+        self.boards = []
+        self.winner = None
+        self.messages = 0
+        self.bytes_received = 0
+
+    async def connect(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    def send(self, payload):
+        self.writer.write(encode_message(payload))
+
+    async def play(self, room='', interval=0.05, timeout=None):
+        """Joins a room, then sends random actions every interval seconds until the match ends
+
+        Returns the winner's player index (ROOM_BUSY if the room's match had
+        already started, None if the timeout hit first).
+        """
+        self.send(bytes([MSG_JOIN]) + room.encode('utf-8'))
+        sender = None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                try:
+                    message = await asyncio.wait_for(read_message(self.reader), remaining)
+                except asyncio.TimeoutError:
+                    return None
+                if message is None:
+                    return None
+                self.messages += 1
+                self.bytes_received += LENGTH.size + len(message)
+                kind = message[0]
+                if kind == MSG_START:
+                    _, self.index, players, self.seed, _ = START.unpack(message)
+                    self.boards = [MirrorBoard() for _ in range(players)]
+                    sender = asyncio.create_task(self.send_actions(interval))
+                elif kind == MSG_STATE:
+                    self.boards[message[1]].apply(message)
+                elif kind == MSG_END:
+                    self.winner = END.unpack(message)[1]
+                    return self.winner
+        finally:
+            if sender is not None:
+                sender.cancel()
+
+    async def send_actions(self, interval):
+        """Sends a few random moves at a time, hard dropping now and then"""
+        while True:
+            await asyncio.sleep(interval)
+            actions = [self.rng.randint(ACTION_LEFT, ACTION_HARD_DROP)
+                       for _ in range(self.actions_per_message)]
+            self.send(bytes([MSG_INPUT]) + bytes(actions))
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def run_bots(host, port, clients, seconds, interval, seed=0):
+    """Connects scripted clients that keep playing matches for `seconds`; returns totals"""
+    deadline = time.monotonic() + seconds
+    totals = {'matches': 0, 'messages': 0, 'bytes': 0}
+
+    async def bot(number):
+        rng = random.Random(seed + number)
+        while time.monotonic() < deadline:
+            client = ScriptedClient(rng.randrange(1 << 32))
+            await client.connect(host, port)
+            try:
+                winner = await client.play(interval=interval, timeout=deadline - time.monotonic())
+            finally:
+                await client.close()
+            totals['messages'] += client.messages
+            totals['bytes'] += client.bytes_received
+            if winner is not None:
+                totals['matches'] += 1
+
+    await asyncio.gather(*(bot(number) for number in range(clients)))
+    return totals
+
+
+async def serve(host, port, room_size, tick_rate, use_srs_kicks):
+    server = TetrisServer(room_size, tick_rate, use_srs_kicks)
+    port = await server.start(host, port)
+    print('Serving on {}:{} ({} players per room)'.format(host, port, room_size))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tetris battle server and scripted clients')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='run the server')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--room-size', type=int, default=ROOM_SIZE, help='players per match')
+    serve_parser.add_argument('--tick-rate', type=int, default=TICK_RATE, help='logic ticks per second')
+    serve_parser.add_argument('--srs', action='store_true', help='use the SRS wall kick tables')
+
+    bots_parser = subparsers.add_parser('bots', help='connect scripted clients to a server')
+    bots_parser.add_argument('--host', default='127.0.0.1')
+    bots_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    bots_parser.add_argument('--clients', type=int, default=2, help='number of simultaneous clients')
+    bots_parser.add_argument('--seconds', type=float, default=10, help='how long to keep playing')
+    bots_parser.add_argument('--interval', type=float, default=0.05, help='seconds between inputs')
+    bots_parser.add_argument('--seed', type=int, default=0, help='seed of the first client script')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'serve':
+            asyncio.run(serve(args.host, args.port, args.room_size, args.tick_rate, args.srs))
+        else:
+            totals = asyncio.run(run_bots(args.host, args.port, args.clients, args.seconds,
+                                          args.interval, args.seed))
+            print('{matches} matches finished, {messages} messages, {bytes} bytes received'.format(**totals))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
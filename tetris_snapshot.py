@@ -0,0 +1,166 @@
+"""Compact bytes for engine snapshots (search, undo and network resync).
+
+TetrisEngine.snapshot() and restore() work on in-memory EngineSnapshots;
+this module turns them into a few dozen bytes and back. A board only
+stores its occupied rows (10 bits each, so 25 bytes at most) and,
+unless colors=False, a 3-bit color id per filled cell. The piece bag is
+stored as the number of pieces taken so far (it is rebuilt from the game
+seed on restore).
+
+Layout:
+    version byte, flags byte (bit 0: game over, bit 1: has a piece, bit 2: colors)
+    varint seed, pieces taken, score, lines, level, pieces placed, fall speed
+    fall time as a little-endian double
+    [piece byte (shape id * 4 + rotation), x + PIECE_OFFSET, y + PIECE_OFFSET]
+    next shape id byte
+    board: varint occupied rows, row bits [, color ids] (packed little-endian)
+
+Usage:
+    data = pack_snapshot(engine.snapshot())
+    engine.restore(unpack_snapshot(data))
+"""
+import struct
+
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT, GRAY, SHAPE_COLORS, SHAPE_NAMES, SHAPE_IDS, EMPTY_COLOR_ROW,
+    BoardSnapshot, EngineSnapshot,
+)
+from tetris_replay import ReplayError, write_varint, read_varint
+
+VERSION = 1
+FLAG_GAME_OVER = 0x01
+FLAG_PIECE = 0x02
+FLAG_COLORS = 0x04
+
+# Piece coordinates can be slightly off the grid (x < 0 or y < 0), so they are stored shifted
+PIECE_OFFSET = 8
+
+FALL_TIME = struct.Struct('<d')
+
+# 3-bit color ids of board cells (the shape id of the piece with that color)
+COLOR_IDS = {SHAPE_COLORS[name]: shape_id for shape_id, name in enumerate(SHAPE_NAMES)}
+OTHER_COLOR = 7  # Anything else (garbage rows), and every cell without colors, comes back as GRAY
+COLOR_BITS = 3
+
+
+class SnapshotError(ReplayError):
+    """Raised for malformed snapshot data"""
+    pass
+
+
+def pack_board(buffer, board, colors=True):
+    """Appends a BoardSnapshot (or Board) to a bytearray, with or without its cell colors"""
+    rows = board.rows
+    first = min(board.tops)  # Rows above the highest block are all empty
+    write_varint(buffer, GRID_HEIGHT - first)
+
+    row_bits = 0
+    color_bits = 0
+    row_shift = 0
+    color_shift = 0
+    for y in range(first, GRID_HEIGHT):
+        row = rows[y]
+        row_bits |= row << row_shift
+        row_shift += GRID_WIDTH
+        if not colors:
+            continue
+        color_row = board.colors[y]
+        for x in range(GRID_WIDTH):
+            if row >> x & 1:
+                color_bits |= COLOR_IDS.get(color_row[x], OTHER_COLOR) << color_shift
+                color_shift += COLOR_BITS
+    buffer += row_bits.to_bytes((row_shift + 7) // 8, 'little')
+    buffer += color_bits.to_bytes((color_shift + 7) // 8, 'little')
+
+
+def unpack_board(data, position=0, colors=True):
+    """Reads a board written by pack_board; returns (BoardSnapshot, new position)"""
+    height, position = read_varint(data, position)
+    if height > GRID_HEIGHT:
+        raise SnapshotError('board has {} rows'.format(height))
+    size = (height * GRID_WIDTH + 7) // 8
+    if position + size > len(data):
+        raise SnapshotError('snapshot data ends in the middle of the board')
+    row_bits = int.from_bytes(data[position:position + size], 'little')
+    position += size
+
+    rows = [0] * (GRID_HEIGHT - height)
+    for _ in range(height):
+        rows.append(row_bits & ((1 << GRID_WIDTH) - 1))
+        row_bits >>= GRID_WIDTH
+
+    cells = sum(bin(row).count('1') for row in rows) if colors else 0
+    size = (cells * COLOR_BITS + 7) // 8
+    if position + size > len(data):
+        raise SnapshotError('snapshot data ends in the middle of the board colors')
+    color_bits = int.from_bytes(data[position:position + size], 'little')
+    position += size
+
+    color_rows = []
+    tops = [GRID_HEIGHT] * GRID_WIDTH
+    for y, row in enumerate(rows):
+        if not row:
+            color_rows.append(EMPTY_COLOR_ROW)
+            continue
+        color_row = [None] * GRID_WIDTH
+        for x in range(GRID_WIDTH):
+            if row >> x & 1:
+                color_id = color_bits & ((1 << COLOR_BITS) - 1) if colors else OTHER_COLOR
+                color_bits >>= COLOR_BITS
+                color_row[x] = SHAPE_COLORS[SHAPE_NAMES[color_id]] if color_id < len(SHAPE_NAMES) else GRAY
+                if tops[x] == GRID_HEIGHT:
+                    tops[x] = y
+        color_rows.append(tuple(color_row))
+    return BoardSnapshot(tuple(rows), tuple(color_rows), tuple(tops)), position
+
+
+def pack_snapshot(snapshot, colors=True):
+    """Encodes an EngineSnapshot as bytes (colors=False leaves out the cell colors)"""
+    buffer = bytearray([VERSION, (FLAG_GAME_OVER if snapshot.game_over else 0) |
+                        (FLAG_PIECE if snapshot.piece is not None else 0) |
+                        (FLAG_COLORS if colors else 0)])
+    for value in (snapshot.seed, snapshot.pieces_taken, snapshot.score, snapshot.lines_cleared,
+                  snapshot.level, snapshot.pieces_placed, snapshot.fall_speed):
+        write_varint(buffer, value)
+    buffer += FALL_TIME.pack(snapshot.fall_time)
+    if snapshot.piece is not None:
+        shape_name, x, y, rotation_state = snapshot.piece
+        buffer += bytes((SHAPE_IDS[shape_name] * 4 + rotation_state, x + PIECE_OFFSET, y + PIECE_OFFSET))
+    buffer.append(SHAPE_IDS[snapshot.next_piece_name])
+    pack_board(buffer, snapshot.board, colors)
+    return bytes(buffer)
+
+
+def unpack_snapshot(data):
+    """Decodes bytes from pack_snapshot into an EngineSnapshot (its bag is rebuilt on restore)"""
+    if len(data) < 2 or data[0] != VERSION:
+        raise SnapshotError('unsupported snapshot version')
+    flags = data[1]
+    position = 2
+    values = []
+    for _ in range(7):
+        value, position = read_varint(data, position)
+        values.append(value)
+    seed, pieces_taken, score, lines_cleared, level, pieces_placed, fall_speed = values
+
+    piece_size = 3 if flags & FLAG_PIECE else 0
+    if position + FALL_TIME.size + piece_size + 1 > len(data):
+        raise SnapshotError('snapshot data ends before the board')
+    fall_time = FALL_TIME.unpack_from(data, position)[0]
+    position += FALL_TIME.size
+    piece = None
+    if piece_size:
+        shape_id, x, y = data[position:position + 3]
+        if shape_id // 4 >= len(SHAPE_NAMES):
+            raise SnapshotError('unknown shape id {}'.format(shape_id // 4))
+        piece = (SHAPE_NAMES[shape_id // 4], x - PIECE_OFFSET, y - PIECE_OFFSET, shape_id % 4)
+        position += 3
+    if data[position] >= len(SHAPE_NAMES):
+        raise SnapshotError('unknown shape id {}'.format(data[position]))
+    next_piece_name = SHAPE_NAMES[data[position]]
+    position += 1
+
+    board, position = unpack_board(data, position, bool(flags & FLAG_COLORS))
+    return EngineSnapshot(board, piece, next_piece_name, seed, None, pieces_taken, score, level,
+                          lines_cleared, pieces_placed, fall_time, fall_speed,
+                          bool(flags & FLAG_GAME_OVER))